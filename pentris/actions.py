@@ -0,0 +1,16 @@
+""" Player actions understood by the simulation engine (see engine.py). They are
+plain integers so that they can be stored compactly and compared cheaply; the
+pygame front end maps key presses onto them.
+"""
+
+LEFT = 0
+RIGHT = 1
+SOFT_DROP = 2
+HARD_DROP = 3
+ROTATE_CW = 4
+ROTATE_CCW = 5
+HOLD = 6
+GRAVITY = 7      # the piece falling one row by itself, locking it if it has landed
+
+NAMES = ("left", "right", "soft drop", "hard drop", "rotate cw", "rotate ccw",
+		"hold", "gravity")
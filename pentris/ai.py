@@ -0,0 +1,249 @@
+""" Computer player for pentris. Placements are scored by a weighted sum of board
+features (aggregate height, holes, bumpiness and lines cleared) and chosen with
+a beam search that looks ahead through the next pieces and the hold slot.
+
+The search works on the occupancy bitmasks only (see Board.rows), so expanding
+a node never copies a Board or a Pentomino. Only the rows from a little above
+the stack down are searched, however tall the board. Each decision is bounded by a time
+budget in milliseconds: when it runs out, the best placement found so far is
+returned, which keeps the player in step with even the fastest fall speeds.
+
+Every node carries the Zobrist hash of its rows (see zobrist.py), updated with
+the keys of the placed minos. Nodes reaching the same board with the same hold
+and queue position are only expanded once, and board evaluations are kept in
+a TranspositionTable shared by every decision, as the boards searched ahead
+for one piece come up again for the next.
+"""
+
+import time
+
+import zobrist
+from gamestate import TranspositionTable
+from pentomino import Pentomino
+
+
+class AI:
+
+	# feature weights, positive features are good
+	HEIGHT_WEIGHT = -0.51
+	LINES_WEIGHT = 0.76
+	HOLES_WEIGHT = -0.36
+	BUMPINESS_WEIGHT = -0.18
+	TOP_OUT = -1e9
+
+	# share of the budget after which the first ply stops trying more hold options;
+	# the rest is left for it to finish and for the plies after it
+	FIRST_PLY_SHARE = 0.5
+
+	def __init__(self, beam_width = 8, budget_ms = 12, table_size = 65536):
+		self.beamWidth = beam_width
+		self.budget = budget_ms / 1000.0
+		self.table = TranspositionTable(table_size)   # board hash -> evaluate() of the board
+
+	def __call__(self, engine):
+		return self.choose(engine)
+
+	def choose(self, engine):
+		# Returns the Placement to play for the engine's current piece (possibly
+		# using the hold slot), or None if the piece has nowhere to go.
+		started = time.perf_counter()
+		deadline = started + self.budget
+		first_deadline = started + self.budget * self.FIRST_PLY_SHARE
+		board = engine.board
+		width = board.BOARD_WIDTH
+
+		# the pieces known in advance, in the order they will be played
+		queue = [engine.currentPiece.shape, engine.nextPiece.shape] + engine.factory.preview()
+		hold = engine.holdPiece.shape if engine.holdPiece is not None else None
+
+		# rows are searched from `start` down: no ply can raise the stack by more
+		# than the tallest piece, and nothing higher can be reached
+		tallest = max(template.height for shape in queue for template in shape)
+		start = max(0, board.top - tallest * (len(queue) + 1))
+		board_rows = [board.rows[y] for y in range(start, board.BOARD_HEIGHT)]
+
+		keys = board.keys
+		seen = set()     # (hash with the hold, queue position) of the nodes of the ply
+
+		# The first ply uses the full reachable-placement search, so tucks and spins
+		# are found. Playing the current piece is always searched, so there is
+		# something to return; the hold options only while within the first ply's
+		# share of the budget.
+		beam = []
+		current = engine.currentPiece
+		for shape, new_hold, used, use_hold in self.options(queue, 0, hold, not engine.usedHold):
+			if beam and time.perf_counter() >= first_deadline:
+				break
+			# the current piece is searched from where it is now, which the player may
+			# have moved it to; a piece swapped in from the hold slot spawns anew
+			if use_hold:
+				piece = Pentomino(shape, None, engine.START_X, engine.START_Y)
+			else:
+				piece = Pentomino(shape, None, current.x, current.y)
+				piece.rotation = current.rotation
+
+			for placement in board.reachablePlacements(piece):
+				template = shape[placement.rotation]
+				rows, cleared = place(board_rows, template, placement.x, placement.y - start, board.FULL_ROW)
+				hash = placedHash(board.hash, keys, template, placement.x, placement.y - start, rows, cleared, start)
+				if not self.visit(seen, hash, new_hold, used):
+					continue
+
+				placement.hold = use_hold
+				value = self.LINES_WEIGHT * cleared
+				if placement.y + template.top < 0:
+					value = self.TOP_OUT    # locking above the board ends the game
+				beam.append((value + self.lookup(rows, hash, width), value, rows, hash, new_hold, used, placement))
+
+		if not beam:
+			return None
+
+		beam.sort(key = lambda node: node[0], reverse = True)
+		beam = beam[:self.beamWidth]
+		best = beam[0]
+
+		# later plies drop pieces straight down from the spawn row, until the
+		# preview runs out or the time budget is spent
+		while True:
+			children = []
+			seen.clear()
+
+			for total, value, rows, hash, hold, used, first in beam:
+				if time.perf_counter() >= deadline:
+					return best[6]     # don't act on a partially searched ply
+
+				tops = columnTops(rows, width)
+
+				for shape, new_hold, new_used, _ in self.options(queue, used, hold, True):
+					for template in shape:
+						if time.perf_counter() >= deadline:
+							return best[6]
+						bottoms = template.columnBottoms
+						for x in range(-template.left, width - template.right):
+							# a straight drop stops where the first mino meets the top of its column
+							y = min([tops[x + dx] - 1 - dy for dx, dy in bottoms])
+							if y + template.top < 0:
+								continue
+
+							new_rows, cleared = place(rows, template, x, y, board.FULL_ROW)
+							new_hash = placedHash(hash, keys, template, x, y, new_rows, cleared, start)
+							if not self.visit(seen, new_hash, new_hold, new_used):
+								continue
+
+							new_value = value + self.LINES_WEIGHT * cleared
+							children.append((new_value + self.lookup(new_rows, new_hash, width), new_value,
+								new_rows, new_hash, new_hold, new_used, first))
+
+			if not children:
+				break
+
+			children.sort(key = lambda node: node[0], reverse = True)
+			beam = children[:self.beamWidth]
+			best = beam[0]
+
+		return best[6]
+
+	def visit(self, seen, hash, hold, used):
+		# False if a node with the same board, hold and queue position is already in the ply
+		node = (hash ^ zobrist.holdKey(hold), used)
+		if node in seen:
+			return False
+		seen.add(node)
+		return True
+
+	def lookup(self, rows, hash, width):
+		# evaluate(rows), from the transposition table when the board was seen before
+		value = self.table.get(hash)
+		if value is None:
+			value = self.evaluate(rows, width)
+			self.table.put(hash, value)
+		return value
+
+	def options(self, queue, used, hold, can_hold):
+		# Yields (shape to play, hold afterwards, queue entries used, whether hold is used)
+		# for the piece at queue[used]: play it, swap it with the hold slot, or hold it
+		# and play the piece after it when the slot is empty.
+		if used >= len(queue):
+			return
+
+		yield queue[used], hold, used + 1, False
+
+		if not can_hold:
+			return
+
+		if hold is not None:
+			if hold is not queue[used]:
+				yield hold, queue[used], used + 1, True
+		elif used + 1 < len(queue):
+			yield queue[used + 1], queue[used], used + 2, True
+
+	def evaluate(self, rows, width):
+		# weighted sum of the aggregate height, holes and bumpiness of the board
+		height = len(rows)
+		column_heights = [0] * width
+		covered = 0     # columns with a mino somewhere above the current row
+		holes = 0
+
+		y = 0
+		while y < height and not rows[y]:    # skip the empty rows at the top
+			y += 1
+
+		for y in range(y, height):
+			row = rows[y]
+			new = row & ~covered
+			while new:
+				bit = new & -new
+				column_heights[bit.bit_length() - 1] = height - y
+				new ^= bit
+
+			holes += bin(covered & ~row).count("1")
+			covered |= row
+
+		bumpiness = 0
+		for x in range(width - 1):
+			bumpiness += abs(column_heights[x] - column_heights[x+1])
+
+		return (self.HEIGHT_WEIGHT * sum(column_heights) + self.HOLES_WEIGHT * holes
+			+ self.BUMPINESS_WEIGHT * bumpiness)
+
+
+def columnTops(rows, width):
+	# index of the highest filled row in each column, len(rows) for empty columns
+	tops = [len(rows)] * width
+	seen = 0
+	for y in range(len(rows)):
+		new = rows[y] & ~seen
+		while new:
+			bit = new & -new
+			tops[bit.bit_length() - 1] = y
+			new ^= bit
+		seen |= rows[y]
+	return tops
+
+def placedHash(hash, keys, template, x, y, rows, cleared, start = 0):
+	# The Zobrist hash of rows, as returned by place(), from the hash of the rows
+	# before the template was locked at (x, y). Clears move rows, so then it is
+	# recomputed. rows are the rows of the board from row start down.
+	if cleared:
+		return zobrist.boardHash(rows, keys, start)
+	left = x + template.left
+	for dy, mask in template.rowMasks:
+		if y + dy >= 0:
+			hash ^= zobrist.rowHash(keys, start + y + dy, mask << left)
+	return hash
+
+def place(rows, template, x, y, full_row):
+	# Returns a copy of rows with the template locked at (x, y) and complete lines
+	# removed, and the number of lines cleared
+	rows = list(rows)
+	left = x + template.left
+	for dy, mask in template.rowMasks:
+		if y + dy >= 0:
+			rows[y + dy] |= mask << left
+
+	remaining = [row for row in rows if row != full_row]
+	cleared = len(rows) - len(remaining)
+	if cleared:
+		rows = [0] * cleared + remaining
+
+	return rows, cleared
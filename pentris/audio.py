@@ -0,0 +1,101 @@
+""" Sound effects and music. The AudioManager decodes every effect once, in a
+background thread at startup, and plays them through a fixed pool of reserved
+mixer channels so nothing is ever loaded from disk in the middle of a frame.
+The mixer itself is initialized and the background music loaded by the same
+thread, so none of it holds up the first frame.
+
+Effects requested before they finished decoding, or while every channel of
+the pool is busy, are skipped and counted (see stats()).
+"""
+
+import threading, time
+
+import pygame
+
+
+class AudioManager:
+
+	def __init__(self, effects, channels = 4):
+		# effects maps a name to the sound file played by play(name)
+		self.files = dict(effects)
+		self.sounds = {}
+		self.pool = []
+		self.music = None
+		self.ready = threading.Event()
+		self.thread = None
+
+		self.played = 0
+		self.dropped = 0     # no free channel in the pool
+		self.late = 0        # requested before the effect was decoded
+		self.errors = []
+		self.loadTime = None     # seconds from start() until the effects were decoded
+
+		self.channelCount = channels
+
+	def start(self, music = None, volume = 0.5):
+		# Starts initializing the mixer and decoding the effects, then loading and
+		# looping the music file if given, in a background thread. Returns immediately.
+		self.thread = threading.Thread(target = self.load, args = (music, volume, time.perf_counter()),
+			name = "audio loader", daemon = True)
+		self.thread.start()
+
+	def load(self, music, volume, started):
+		try:
+			if not pygame.mixer.get_init():
+				pygame.mixer.init()
+		except pygame.error as error:    # no audio device, play silently
+			self.errors.append(str(error))
+			self.ready.set()
+			return
+
+		pygame.mixer.set_reserved(self.channelCount)
+		self.pool = [pygame.mixer.Channel(i) for i in range(self.channelCount)]
+
+		for name, filename in self.files.items():
+			try:
+				self.sounds[name] = pygame.mixer.Sound(filename)
+			except (pygame.error, FileNotFoundError) as error:
+				self.errors.append("%s: %s" % (filename, error))
+
+		self.loadTime = time.perf_counter() - started
+		self.ready.set()
+
+		if music is not None:
+			try:
+				pygame.mixer.music.load(music)
+				pygame.mixer.music.set_volume(volume)
+				pygame.mixer.music.play(-1, 0.0)     # loop indefinitely
+				self.music = music
+			except pygame.error as error:
+				self.errors.append("%s: %s" % (music, error))
+
+	def wait(self, timeout = None):
+		# blocks until every effect has been decoded, returns whether they are
+		return self.ready.wait(timeout)
+
+	def play(self, name):
+		# plays the named effect on a free pooled channel, returns whether it was played
+		sound = self.sounds.get(name)
+		if sound is None:
+			if name not in self.files:
+				raise KeyError("unknown sound effect: %r" % (name,))
+			if not self.ready.is_set():
+				self.late += 1
+			return False
+
+		for channel in self.pool:
+			if not channel.get_busy():
+				channel.play(sound)
+				self.played += 1
+				return True
+
+		self.dropped += 1
+		return False
+
+	def stopMusic(self):
+		if self.music is not None:
+			pygame.mixer.music.stop()
+
+	def stats(self):
+		return {"played": self.played, "dropped": self.dropped, "late": self.late,
+			"loaded": len(self.sounds), "load_time": self.loadTime, "errors": list(self.errors)}
@@ -0,0 +1,233 @@
+""" Vectorized batch of pentris games. BatchEngine runs N boards in lock-step,
+all stored in a single uint8 array of shape (N, height, width), and applies
+one placement per board per call to step(). Collision tests, locking, line
+clears and scoring are NumPy array operations over every board at once, so
+advancing thousands of games costs one call instead of N Python loops.
+
+The rules follow engine.py: pieces come from a bag of all 18 shapes, spawn
+at the same location, are hard dropped straight down (2 points per row) and
+score Engine.LINE_SCORES times (level+1) for cleared lines. A cell holds 0
+when empty and the index of its color in Board.COLORS plus one otherwise.
+
+Requires numpy.
+"""
+
+import numpy as np
+
+from board import Board
+from engine import Engine
+from factory import Factory
+
+
+def _compileTables(shapes):
+	# Packs the compiled shapes into (shape, rotation, mino) arrays. Shapes with
+	# fewer than four rotations repeat their templates, so any rotation index works.
+	count = len(shapes)
+	minos = max(len(template.cells) for shape in shapes for template in shape)
+
+	cell_x = np.zeros((count, 4, minos), np.int64)
+	cell_y = np.zeros((count, 4, minos), np.int64)
+	left = np.zeros((count, 4), np.int64)
+	right = np.zeros((count, 4), np.int64)
+
+	for s, shape in enumerate(shapes):
+		for r in range(4):
+			template = shape[r % len(shape)]
+			if len(template.cells) != minos:
+				raise ValueError("every shape must have the same number of minos!")
+
+			cell_x[s, r] = [x for x, y in template.cells]
+			cell_y[s, r] = [y for x, y in template.cells]
+			left[s, r] = template.left
+			right[s, r] = template.right
+
+	rotations = np.array([len(shape) for shape in shapes], np.int64)
+	return cell_x, cell_y, left, right, rotations
+
+
+class BatchEngine:
+
+	CELL_X, CELL_Y, LEFT, RIGHT, ROTATIONS = _compileTables(Factory.SHAPES)
+	LINE_SCORES = np.array(Engine.LINE_SCORES, np.int64)
+
+	def __init__(self, n, board_width = 14, board_height = 24, seed = None):
+		self.N = n
+		self.BOARD_WIDTH = board_width
+		self.BOARD_HEIGHT = board_height
+		self.START_X = board_width // 2 - 2
+		self.START_Y = Engine.START_Y
+
+		self.rng = np.random.default_rng(seed)
+		self.boards = np.zeros((n, board_height, board_width), np.uint8)
+
+		self.score = np.zeros(n, np.int64)
+		self.lines = np.zeros(n, np.int64)
+		self.level = np.zeros(n, np.int64)
+		self.piecesPlaced = np.zeros(n, np.int64)
+		self.gameOver = np.zeros(n, bool)
+
+		# each board draws from its own bag holding one of each shape
+		self.bags = self._newBags(n)
+		self.bagPosition = np.zeros(n, np.int64)
+
+		self.current = self._drawShapes(np.arange(n))
+		self.currentColor = self._drawColors(n)
+		self.next = self._drawShapes(np.arange(n))
+		self.nextColor = self._drawColors(n)
+
+	def _newBags(self, count):
+		keys = self.rng.random((count, len(Factory.SHAPES)))
+		return np.argsort(keys, axis=1)
+
+	def _drawShapes(self, index):
+		# pops the next shape from the bags of the given boards, refilling empty bags
+		shapes = self.bags[index, self.bagPosition[index]]
+		self.bagPosition[index] += 1
+
+		empty = index[self.bagPosition[index] == self.bags.shape[1]]
+		if len(empty):
+			self.bags[empty] = self._newBags(len(empty))
+			self.bagPosition[empty] = 0
+
+		return shapes
+
+	def _drawColors(self, count):
+		return self.rng.integers(0, len(Board.COLORS), count).astype(np.uint8)
+
+	def placementRange(self, shapes, rotations):
+		# smallest and largest x keeping each piece inside the walls
+		rotations = rotations % self.ROTATIONS[shapes]
+		return (-self.LEFT[shapes, rotations],
+			self.BOARD_WIDTH - 1 - self.RIGHT[shapes, rotations])
+
+	def columnTops(self, index = None):
+		# index of the highest filled row in each column, BOARD_HEIGHT for empty columns
+		boards = self.boards if index is None else self.boards[index]
+		filled = boards != 0
+		return np.where(filled.any(axis=1), filled.argmax(axis=1), self.BOARD_HEIGHT)
+
+	def collides(self, index, shapes, x, y, rotations):
+		# True for every board in index where the piece overlaps a wall, the floor or a mino;
+		# minos above the top of the board never collide
+		rotations = rotations % self.ROTATIONS[shapes]
+		cx = self.CELL_X[shapes, rotations] + x[:, None]
+		cy = self.CELL_Y[shapes, rotations] + y[:, None]
+
+		outside = (cx < 0) | (cx >= self.BOARD_WIDTH) | (cy >= self.BOARD_HEIGHT)
+		visible = (cy >= 0) & ~outside
+		rows = np.broadcast_to(index[:, None], cx.shape)
+		hits = np.zeros(cx.shape, bool)
+		hits[visible] = self.boards[rows[visible], cy[visible], cx[visible]] != 0
+
+		return (outside | hits).any(axis=1)
+
+	def step(self, x, rotations):
+		# Hard drops the current piece of every running board at column x with the
+		# given rotation (arrays of length N), locks it, clears lines and spawns the
+		# next piece. x is clamped into the board. Returns the lines cleared per board.
+		x = np.asarray(x, np.int64)
+		rotations = np.asarray(rotations, np.int64)
+		cleared = np.zeros(self.N, np.int64)
+
+		active = np.flatnonzero(~self.gameOver)
+		if not len(active):
+			return cleared
+
+		shapes = self.current[active]
+		rot = rotations[active] % self.ROTATIONS[shapes]
+		low, high = self.placementRange(shapes, rot)
+		px = np.clip(x[active], low, high)
+
+		# a straight drop lands where the first mino meets the top of its column
+		cx = self.CELL_X[shapes, rot] + px[:, None]
+		cy = self.CELL_Y[shapes, rot]
+		tops = np.take_along_axis(self.columnTops(active), cx, axis=1)
+		py = (tops - 1 - cy).min(axis=1)
+
+		# a piece that can't even be moved to its column tops out
+		blocked = self.collides(active, shapes, px, np.full(len(active), self.START_Y), rot)
+
+		# a piece spawning below an overhang would land above its spawn row that way;
+		# it is walked down from the spawn row instead, like Engine.hardDropTo does
+		under = np.flatnonzero((py < self.START_Y) & ~blocked)
+		if len(under):
+			py[under] = self._walkDown(active[under], shapes[under], px[under], rot[under])
+
+		# and so does one locking above the board
+		topped = blocked | ((py[:, None] + cy) < 0).any(axis=1)
+		self.gameOver[active[topped]] = True
+
+		landed = ~topped
+		boards = active[landed]
+		rows = py[landed, None] + cy[landed]
+		columns = cx[landed]
+		colors = self.currentColor[boards] + 1
+		self.boards[np.broadcast_to(boards[:, None], rows.shape), rows, columns] = colors[:, None]
+
+		self.score[boards] += 2 * (py[landed] - self.START_Y)
+		self.piecesPlaced[boards] += 1
+
+		cleared[boards] = self._clearLines(boards)
+		self.lines[boards] += cleared[boards]
+		self.score[boards] += self.LINE_SCORES[np.minimum(cleared[boards], 5)] * (self.level[boards] + 1)
+		self.level[boards] = self.lines[boards] // Engine.LINES_PER_LEVEL
+
+		self._spawn(boards)
+		return cleared
+
+	def _walkDown(self, index, shapes, x, rotations):
+		# the row each piece stops at when moved down one row at a time from the spawn row
+		y = np.full(len(index), self.START_Y, np.int64)
+		falling = np.arange(len(index))
+		while len(falling):
+			landed = self.collides(index[falling], shapes[falling], x[falling], y[falling] + 1,
+				rotations[falling])
+			falling = falling[~landed]
+			y[falling] += 1
+		return y
+
+	def _clearLines(self, index):
+		# removes the complete rows of the given boards in one pass, returns how many each lost
+		full = (self.boards[index] != 0).all(axis=2)
+		counts = full.sum(axis=1)
+
+		changed = counts > 0
+		if changed.any():
+			index = index[changed]
+			full = full[changed]
+
+			# a stable sort moves the full rows to the top and keeps the others in order
+			order = np.argsort(~full, axis=1, kind="stable")
+			boards = np.take_along_axis(self.boards[index], order[:, :, None], axis=1)
+			boards[np.arange(self.BOARD_HEIGHT)[None, :] < counts[changed, None]] = 0
+			self.boards[index] = boards
+
+		return counts
+
+	def _spawn(self, index):
+		self.current[index] = self.next[index]
+		self.currentColor[index] = self.nextColor[index]
+		self.next[index] = self._drawShapes(index)
+		self.nextColor[index] = self._drawColors(len(index))
+
+		# new piece can't fit on the board, game over!
+		count = len(index)
+		blocked = self.collides(index, self.current[index], np.full(count, self.START_X),
+			np.full(count, self.START_Y), np.zeros(count, np.int64))
+		self.gameOver[index[blocked]] = True
+
+	def reset(self, index = None):
+		# starts fresh games on the given boards (all of the finished ones by default)
+		index = np.flatnonzero(self.gameOver) if index is None else np.asarray(index)
+
+		self.boards[index] = 0
+		self.score[index] = 0
+		self.lines[index] = 0
+		self.level[index] = 0
+		self.piecesPlaced[index] = 0
+		self.gameOver[index] = False
+
+		self.current[index] = self._drawShapes(index)
+		self.currentColor[index] = self._drawColors(len(index))
+		self.next[index] = self._drawShapes(index)
+		self.nextColor[index] = self._drawColors(len(index))
@@ -0,0 +1,358 @@
+""" Benchmarks of the hot paths of pentris, reported in operations per second.
+
+	python bench.py                          # run everything, compare with bench_baseline.json
+	python bench.py --save-baseline          # run everything and store the result as the baseline
+	python bench.py valid ghost --repeat 9   # run some of them
+
+Every benchmark builds its boards and pieces from a seed, so two runs measure
+exactly the same work. Each one is run in --repeat rounds of at least
+--min-time seconds and the best rate is kept. The results can be written to
+JSON with --output; when a baseline file exists, any metric slower than the
+baseline by more than --threshold (a fraction) is reported and the exit
+status is 1.
+
+The draw benchmarks need pygame and run under the SDL dummy video driver.
+The sparse_* benchmarks play on a board thousands of rows tall stored
+sparsely (see Board), drawn through a scrolling viewport.
+"""
+
+import argparse, copy, gc, json, os, platform, random, sys, time
+
+from board import Board
+from engine import Engine
+from factory import Factory
+from pentomino import Pentomino, Placement
+
+BOARD_WIDTH = 14
+BOARD_HEIGHT = 24
+
+TALL_WIDTH = 40          # the board of the sparse_* benchmarks
+TALL_HEIGHT = 5000
+
+
+def randomEngine(seed, pieces = 40, width = BOARD_WIDTH, height = BOARD_HEIGHT, sparse = False):
+	# an engine whose board holds the stack left by up to `pieces` random straight drops
+	rng = random.Random(seed)
+	engine = Engine(width, height, seed = seed, sparse = sparse)
+
+	while not engine.gameOver and engine.piecesPlaced < pieces:
+		piece = engine.currentPiece
+		rotation = rng.randrange(len(piece.shape))
+		template = piece.shape[rotation]
+		x = rng.randint(-template.left, width - 1 - template.right)
+		try:
+			engine.hardDropTo(Placement(x, rotation), trusted = True)    # any straight drop will do
+		except ValueError:     # blocked at the spawn row, the stack is high enough
+			break
+
+	return engine
+
+def copyBoard(board):
+	# a copy sharing nothing mutable with the original, much faster than deepcopy
+	board = copy.copy(board)
+	if board.sparse:
+		board.board = board.board.copy(list)
+		board.rows = board.rows.copy()
+		board.shared = board.shared.copy()
+	else:
+		board.board = [list(row) for row in board.board]
+		board.rows = list(board.rows)
+		board.shared = bytearray(board.BOARD_HEIGHT)
+	board.tops = list(board.tops)
+	return board
+
+def randomBoards(seed, count):
+	# count boards of varying heights, with the piece in play on each
+	rng = random.Random(seed)
+	return [randomEngine(rng.randrange(1 << 30), rng.randrange(5, 60)) for i in range(count)]
+
+def randomProbes(seed, count, engines):
+	# (board, piece) pairs, each piece at a random rotation and column where it fits above the stack
+	rng = random.Random(seed)
+	probes = []
+	while len(probes) < count:
+		engine = rng.choice(engines)
+		board = engine.board
+		piece = Pentomino(rng.choice(Factory.SHAPES), rng.choice(Board.COLORS), 0, Engine.START_Y)
+		piece.rotation = rng.randrange(len(piece.shape))
+		template = piece.getCurrentTemplate()
+		piece.x = rng.randint(-template.left, board.BOARD_WIDTH - 1 - template.right)
+		piece.y = rng.randint(Engine.START_Y, max(Engine.START_Y, min(board.tops) - 1 - template.bottom))
+		if board.isPentominoValid(piece):
+			probes.append((board, piece))
+	return probes
+
+
+# Every benchmark takes a seed, does its setup, and returns (prepare, operations):
+# prepare() returns a function performing that many operations, which is what
+# gets timed. Benchmarks that change their boards prepare fresh copies each time.
+
+def benchValid(seed):
+	engines = randomBoards(seed, 20)
+	probes = randomProbes(seed, 5000, engines)
+	moves = [(0, 0, 0), (-1, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1), (0, 0, -1)]
+
+	def run():
+		for board, piece in probes:
+			for dx, dy, drot in moves:
+				board.isPentominoValid(piece, dx, dy, drot)
+
+	return lambda: run, len(probes) * len(moves)
+
+def benchAdd(seed):
+	# locking pieces at their landing spots, one per board copy
+	engines = randomBoards(seed, 20)
+	probes = randomProbes(seed, 2000, engines)
+	for board, piece in probes:
+		piece.y = board.ghostY(piece)
+
+	def prepare():
+		pairs = [(copyBoard(board), piece) for board, piece in probes]
+
+		def run():
+			for board, piece in pairs:
+				board.addPentominoToBoard(piece)
+		return run
+
+	return prepare, len(probes)
+
+def benchLines(seed):
+	# line checks on board copies with zero to five complete rows
+	rng = random.Random(seed)
+	originals = []
+	for engine in randomBoards(seed, 20):
+		for i in range(20):
+			board = copyBoard(engine.board)
+			for y in rng.sample(range(board.BOARD_HEIGHT), rng.randrange(6)):
+				board.board[y] = [rng.choice(Board.COLORS)] * board.BOARD_WIDTH
+				board.rows[y] = board.FULL_ROW
+			board.updateTops()
+			originals.append(board)
+
+	def prepare():
+		boards = [copyBoard(board) for board in originals]
+
+		def run():
+			for board in boards:
+				board.checkForCompleteLines()
+		return run
+
+	return prepare, len(originals)
+
+def benchGhost(seed):
+	engines = randomBoards(seed, 20)
+	probes = randomProbes(seed, 5000, engines)
+
+	def run():
+		for board, piece in probes:
+			piece.ghost = None      # measure the drop itself, not the cache
+			board.ghostY(piece)
+
+	return lambda: run, len(probes)
+
+def benchFactory(seed):
+	factory = Factory(seed)
+	count = 50000
+
+	def run():
+		for i in range(count):
+			factory.obtainShape()
+
+	return lambda: run, count
+
+def benchGame(seed):
+	# placements per second of complete headless games with random straight drops
+	games = range(seed, seed + 20)
+
+	def run():
+		for game in games:
+			randomEngine(game, pieces = 10000)
+
+	# the number of placements is only known afterwards, so it is counted by a dry run
+	return lambda: run, sum(randomEngine(game, pieces = 10000).piecesPlaced for game in games)
+
+def benchSparseGame(seed):
+	# placements per second of random straight drops on a tall sparse board
+	pieces = 3000
+
+	def run():
+		randomEngine(seed, pieces, TALL_WIDTH, TALL_HEIGHT, sparse = True)
+
+	return lambda: run, randomEngine(seed, pieces, TALL_WIDTH, TALL_HEIGHT, sparse = True).piecesPlaced
+
+def benchSparseLines(seed):
+	# line clears on copies of a tall sparse board, its stack topped with complete rows
+	rng = random.Random(seed)
+	originals = []
+	for i in range(10):
+		board = randomEngine(rng.randrange(1 << 30), 300, TALL_WIDTH, TALL_HEIGHT, sparse = True).board
+		for y in rng.sample(range(board.top, TALL_HEIGHT), rng.randrange(1, 6)):
+			board.board[y] = [rng.choice(Board.COLORS)] * board.BOARD_WIDTH
+			board.rows[y] = board.FULL_ROW
+		board.updateTops()
+		originals.append(board)
+
+	def prepare():
+		boards = [copyBoard(board) for board in originals for i in range(10)]
+
+		def run():
+			for board in boards:
+				board.checkForCompleteLines()
+		return run
+
+	return prepare, len(originals) * 10
+
+def drawSetup(seed, engine = None, visible_rows = None):
+	os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+	import pygame
+	from renderer import Renderer
+
+	pygame.display.init()
+	surface = pygame.Surface((900, 675))
+	engine = engine or randomEngine(seed)
+	engine.board.MINO_SIZE = 26
+	return surface, engine, Renderer(engine.board, 268, 41, visible_rows)
+
+def benchDrawFrame(seed):
+	# frames where the falling piece moves one column
+	surface, engine, renderer = drawSetup(seed)
+	piece = engine.currentPiece
+	renderer.draw(surface, piece)
+	frames = 2000
+
+	def run():
+		for i in range(frames):
+			piece.x += 1 if i % 2 else -1
+			renderer.draw(surface, piece)
+
+	return lambda: run, frames
+
+def benchDrawFull(seed):
+	# full redraws of the window, as after invalidate()
+	surface, engine, renderer = drawSetup(seed)
+	frames = 200
+
+	def run():
+		for i in range(frames):
+			renderer.invalidate()
+			renderer.draw(surface, engine.currentPiece)
+
+	return lambda: run, frames
+
+def benchSparseDraw(seed):
+	# frames of a piece falling down a tall sparse board, the viewport scrolling along
+	surface, engine, renderer = drawSetup(seed,
+		randomEngine(seed, 300, BOARD_WIDTH, TALL_HEIGHT, sparse = True), BOARD_HEIGHT)
+	piece = engine.currentPiece
+	start = piece.y
+	landing = engine.board.ghostY(piece)
+	frames = 2000
+
+	def run():
+		for i in range(frames):
+			piece.y = start + i % (landing - start + 1)
+			renderer.draw(surface, piece)
+
+	return lambda: run, frames
+
+
+BENCHMARKS = {
+	"valid": benchValid,
+	"add": benchAdd,
+	"lines": benchLines,
+	"ghost": benchGhost,
+	"factory": benchFactory,
+	"game": benchGame,
+	"draw_frame": benchDrawFrame,
+	"draw_full": benchDrawFull,
+	"sparse_game": benchSparseGame,
+	"sparse_lines": benchSparseLines,
+	"sparse_draw": benchSparseDraw,
+}
+
+def measure(benchmark, seed, repeat, min_time = 0.2):
+	# Best rate in operations per second over `repeat` rounds. A round sets the
+	# benchmark up and runs it as many times as needed to take at least min_time
+	# seconds; the garbage collector is paused while the clock runs, as in timeit.
+	best = 0.0
+	for i in range(repeat):
+		prepare, count = benchmark(seed)
+		operations = 0
+		elapsed = 0.0
+		while elapsed < min_time:
+			run = prepare()
+			collecting = gc.isenabled()
+			gc.disable()
+			try:
+				start = time.perf_counter()
+				run()
+				elapsed += time.perf_counter() - start
+			finally:
+				if collecting:
+					gc.enable()
+			operations += count
+		best = max(best, operations / elapsed)
+	return best
+
+def compare(results, baseline, threshold):
+	# names of the metrics more than threshold (a fraction) slower than in the baseline
+	return [name for name, rate in results.items()
+		if name in baseline and rate < baseline[name] * (1 - threshold)]
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = "Benchmark the hot paths of pentris.")
+	parser.add_argument("names", nargs = "*", help = "benchmarks to run (default: all of %s)" % ", ".join(BENCHMARKS))
+	parser.add_argument("--seed", type = int, default = 0, help = "seed of the generated boards")
+	parser.add_argument("--repeat", type = int, default = 5, help = "rounds per benchmark, the best is kept")
+	parser.add_argument("--min-time", type = float, default = 0.2, help = "seconds each round runs for at least")
+	parser.add_argument("--output", help = "write the results to this JSON file")
+	parser.add_argument("--baseline", default = "bench_baseline.json", help = "JSON file to compare against")
+	parser.add_argument("--save-baseline", action = "store_true", help = "store the results as the new baseline")
+	parser.add_argument("--threshold", type = float, default = 0.15, help = "allowed slowdown, as a fraction")
+	args = parser.parse_args(argv)
+
+	unknown = [name for name in args.names if name not in BENCHMARKS]
+	if unknown:
+		parser.error("unknown benchmarks: %s" % ", ".join(unknown))
+
+	baseline = {}
+	if os.path.exists(args.baseline) and not args.save_baseline:
+		with open(args.baseline) as stream:
+			baseline = json.load(stream)["metrics"]
+
+	results = {}
+	for name in args.names or BENCHMARKS:
+		try:
+			results[name] = measure(BENCHMARKS[name], args.seed, args.repeat, args.min_time)
+		except ImportError as error:     # pygame missing for the draw benchmarks
+			print("%-12s skipped: %s" % (name, error))
+			continue
+
+		line = "%-12s %14.1f ops/s" % (name, results[name])
+		if name in baseline:
+			line += "   %+7.1f%% vs baseline" % (100.0 * (results[name] / baseline[name] - 1))
+		print(line)
+		sys.stdout.flush()
+
+	report = {"time": time.time(), "seed": args.seed, "python": platform.python_version(),
+		"machine": platform.machine(), "metrics": results}
+
+	if args.output:
+		with open(args.output, "w") as stream:
+			json.dump(report, stream, indent = 1)
+
+	if args.save_baseline:
+		with open(args.baseline, "w") as stream:
+			json.dump(report, stream, indent = 1)
+		print("saved baseline to %s" % args.baseline)
+		return 0
+
+	regressed = compare(results, baseline, args.threshold)
+	if regressed:
+		print("REGRESSED by more than %d%%: %s" % (100 * args.threshold, ", ".join(regressed)))
+		return 1
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
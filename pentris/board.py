@@ -1,10 +1,28 @@
 """Board class representing the playing field. The board matrix holds data
 about colors and is represented by a grid of arbitrary size, constructed
 at runtime.
+
+Occupancy is kept separately from the colors: each row of the board is also
+stored as an integer bitmask (bit x set means column x holds a mino). The
+collision and line checks only ever look at these masks; the color matrix is
+used for drawing.
+
+The board also keeps a Zobrist hash of its occupancy up to date (see
+zobrist.py), and can take copy-on-write snapshots: a snapshot shares the
+board's rows, and a shared row is only copied when the board next writes to it.
+
+Boards created with sparse = True store only the rows that hold minos (see
+SparseRows), for very tall boards. Either way the board tracks its highest
+occupied row (self.top), and line clears, skyline updates and drawing only
+visit the rows from there down, so their cost follows the height of the stack
+rather than the size of the board.
 """
 
-import pygame, sys, copy
-from pygame.locals import *
+from array import array
+
+import actions
+import zobrist
+from pentomino import Placement
 
 class Board:
 
@@ -31,160 +49,514 @@ class Board:
 				RED, SILVER, TEAL, WHITE, YELLOW)
 
 
-	def __init__(self, board_width, board_height, mino_size):
+	def __init__(self, board_width, board_height, mino_size, sparse = False):
 		# Create an empty board and store instance variables
 		# BOARD_WIDTH and BOARD_HEIGHT are number of minos, NOT pixels!
-		self.board = []
-
-		for i in range(board_height):
-			self.board.append([self.EMPTY] * board_width)
-
+		# sparse stores only the rows holding minos, for boards thousands of rows tall
 		self.MINO_SIZE = mino_size
 		self.BOARD_WIDTH = board_width
 		self.BOARD_HEIGHT = board_height
+		self.FULL_ROW = (1 << board_width) - 1
+		self.EMPTY_ROW = (self.EMPTY,) * board_width
+		self.sparse = sparse
+
+		# colors, and the occupancy layer: one bitmask per row. Of a sparse board's
+		# rows, which are all shared until written to, only the private ones are stored.
+		if sparse:
+			self.board = SparseRows(board_height, self.EMPTY_ROW)
+			self.rows = SparseRows(board_height, 0)
+			self.shared = SparseRows(board_height, 1)
+		else:
+			self.board = []
+			for i in range(board_height):
+				self.board.append([self.EMPTY] * board_width)
+			self.rows = [0] * board_height
+			self.shared = bytearray(board_height)
+
+		# skyline: index of the highest filled row of each column, board_height if empty
+		self.tops = [board_height] * board_width
+
+		# the highest row holding a mino, board_height if empty; every row above it is empty
+		self.top = board_height
+
+		# bumped whenever minos are added or removed, so cached results can be checked
+		self.version = 0
+
+		# Zobrist hash of the occupancy (self.shared above tells which rows of
+		# self.board a snapshot shares)
+		self.keys = zobrist.cellKeys(board_width, board_height)
+		self.hash = 0
 
 	def isLineComplete(self, y):
 		#  Given a specific row on the board, return whether the row is filled with minos.
 		if y < 0 or y >= self.BOARD_HEIGHT:
 			raise ValueError("passed-in y does not exist on the board!")
 
-		for x in range(self.BOARD_WIDTH):
-			if self.board[y][x] == self.EMPTY:
-				return False
-
-		return True
+		return self.rows[y] == self.FULL_ROW
 
 	def checkForCompleteLines(self):
 		# Removes any completed lines from the board and returns the number removed.
-		numLines = 0
-
-		# check each row, start from bottom of board
-		y = self.BOARD_HEIGHT - 1
-		while y >= 0:
-
-			if self.isLineComplete(y):
-				# shift every row above down one row
-				for row in range(y-1, -1, -1):
-					self.board[row+1] = self.board[row]
-
-				# remove the top line
-				self.board[0] = [self.EMPTY]*self.BOARD_WIDTH
-
-				# On the next iteration, make sure we check te line we just pulled down
-				y += 1
-				numLines += 1
-
-			y -= 1
-		return numLines
-
-	def drawBoard(self, spritebatch, x_coord, y_coord):
+		return len(self.clearCompleteLines())
+
+	def clearCompleteLines(self):
+		# Removes every completed line in a single sweep and returns their indices
+		# (as they were before the removal), top to bottom. The row lists of the
+		# cleared lines are emptied and reused as the rows opened at the top of
+		# the stack; a sparse board just drops them.
+		full = self.FULL_ROW
+		rows = self.rows
+		top = self.top
+		cleared = [y for y in range(top, self.BOARD_HEIGHT) if rows[y] == full]
+		if not cleared:
+			return cleared
+
+		board = self.board
+		shared = self.shared
+		recycled = []
+
+		# the rows that move leave the hash here and are added back where they land
+		self.hash ^= self.rowsHash(top, cleared[-1] + 1)
+
+		# rows below the lowest cleared line stay where they are; every row of the
+		# stack above it moves down once, by the number of cleared lines beneath it
+		write = cleared[-1]
+		for read in range(cleared[-1], top - 1, -1):
+			if rows[read] == full:
+				if not self.sparse:
+					recycled.append(board[read] if not shared[read] else list(self.EMPTY_ROW))
+				continue
+
+			board[write] = board[read]
+			rows[write] = rows[read]
+			shared[write] = shared[read]
+			write -= 1
+
+		for y in range(top, top + len(cleared)):
+			if self.sparse:
+				board[y] = self.EMPTY_ROW     # not stored
+				shared[y] = 1
+			else:
+				row = recycled.pop()
+				row[:] = self.EMPTY_ROW
+				board[y] = row
+				shared[y] = 0
+			rows[y] = 0
+
+		self.hash ^= self.rowsHash(top + len(cleared), cleared[-1] + 1)
+
+		top += len(cleared)
+		while top < self.BOARD_HEIGHT and not rows[top]:
+			top += 1
+		self.top = top
+
+		# a column's top only needs searching for if it was on a cleared line,
+		# otherwise it just moves down with its row
+		tops = self.tops
+		for x in range(self.BOARD_WIDTH):
+			top = tops[x]
+			if top == self.BOARD_HEIGHT:
+				continue
+			if top in cleared:
+				self.updateTops()
+				break
+			tops[x] = top + sum(1 for y in cleared if y > top)
+
+		self.version += 1
+		return cleared
+
+	def rowsHash(self, start, end):
+		# XOR of the cell keys of the minos in rows start to end (excluded), as zobrist.rowHash
+		value = 0
+		rows = self.rows
+		tables = self.keys.tables
+		for y in range(start, end):
+			mask = rows[y]
+			if mask:
+				for table in tables[y]:
+					value ^= table[mask & 255]
+					mask >>= 8
+		return value
+
+	def addGarbageLines(self, count, hole, color = GRAY):
+		# Pushes the whole stack up by count rows and fills the rows opened at the
+		# bottom with garbage: full but for the mino at column hole. Returns False
+		# if minos were pushed off the top of the board.
+		count = min(count, self.BOARD_HEIGHT)
+		if count <= 0:
+			return True
+
+		overflow = self.top < count
+		if self.sparse:
+			self.rows.shift(-count)
+			self.board.shift(-count)
+			self.shared.shift(-count)
+		else:
+			del self.rows[:count]
+			del self.board[:count]
+			del self.shared[:count]
+			self.rows.extend([0] * count)
+			self.board.extend([None] * count)
+			self.shared.extend(bytes(count))
+
+		mask = self.FULL_ROW & ~(1 << hole)
+		for y in range(self.BOARD_HEIGHT - count, self.BOARD_HEIGHT):
+			self.rows[y] = mask
+			row = [color] * self.BOARD_WIDTH
+			row[hole] = self.EMPTY
+			self.board[y] = row
+			self.shared[y] = 0
+
+		self.updateTops()
+		self.hash = self.rowsHash(self.top, self.BOARD_HEIGHT)    # every row moved
+		self.version += 1
+		return not overflow
+
+	def updateTops(self):
+		# Recomputes the top row and the skyline from the occupancy rows, top down
+		# until every column is seen. Must be called after changing self.rows directly.
+		if self.sparse:
+			self.top = self.rows.first()
+		else:
+			self.top = next((y for y in range(self.BOARD_HEIGHT) if self.rows[y]), self.BOARD_HEIGHT)
+
+		tops = [self.BOARD_HEIGHT] * self.BOARD_WIDTH
+		seen = 0
+		for y in range(self.top, self.BOARD_HEIGHT):
+			new = self.rows[y] & ~seen
+			while new:
+				bit = new & -new
+				tops[bit.bit_length() - 1] = y
+				new ^= bit
+			seen |= self.rows[y]
+			if seen == self.FULL_ROW:
+				break
+		self.tops = tops
+
+	def drawBoard(self, spritebatch, x_coord, y_coord, first_row = 0, row_count = None):
 		# draws the board and its contents
 		# x_coord and y_coord, where to draw the board, are to be handled by client functions
+		# first_row and row_count pick the rows shown, all of them by default
+		import pygame   # only the drawing code needs pygame
+
+		if row_count is None:
+			row_count = self.BOARD_HEIGHT - first_row
 
 		# draws border around the board
 		pygame.draw.rect(spritebatch, self.SILVER, (x_coord, y_coord-7, 
-			(self.BOARD_WIDTH*self.MINO_SIZE)+8, (self.BOARD_HEIGHT*self.MINO_SIZE)+8), 5)
+			(self.BOARD_WIDTH*self.MINO_SIZE)+8, (row_count*self.MINO_SIZE)+8), 5)
+
+		self.drawRows(spritebatch, x_coord, y_coord, first_row, row_count)
+
+	def drawRows(self, spritebatch, x_coord, y_coord, first_row, row_count):
+		# fills the background of row_count rows from first_row, drawn from y_coord down,
+		# then draws every mino on them in one batch
+		import pygame
 
-		# fills the background of the board
 		pygame.draw.rect(spritebatch, self.BLACK, 
-			(x_coord, y_coord, self.MINO_SIZE*self.BOARD_WIDTH, self.MINO_SIZE*self.BOARD_HEIGHT))
+			(x_coord, y_coord, self.MINO_SIZE*self.BOARD_WIDTH, self.MINO_SIZE*row_count))
 
-		# draws each individual mino on the board
-		for y in range(self.BOARD_HEIGHT):
-			for x in range(self.BOARD_WIDTH):
-				if self.board[y][x] != ".":
-					self.drawMino(spritebatch, x, y, self.board[y][x], x_coord, y_coord)
+		blits = []
+		board_y = y_coord - first_row * self.MINO_SIZE
+		for y in range(max(first_row, self.top), min(first_row + row_count, self.BOARD_HEIGHT)):
+			blits += self.rowBlits(y, x_coord, board_y)
+		spritebatch.blits(blits, False)
+
+	def drawRow(self, spritebatch, y, x_coord, y_coord):
+		# draws the minos of a single row, on top of whatever is already there
+		spritebatch.blits(self.rowBlits(y, x_coord, y_coord), False)
 
 	def drawMino(self, spritebatch, mino_x, mino_y, color, board_x, board_y):
 		# color should be an RGB tuple
 		# mino_x and mino_y are the INDICIES of the minos on the board, NOT their pixel locations
 		# board_x and board_y ARE the pixel locations of the top-left corner of the board
-		pixel_x = board_x + (mino_x * self.MINO_SIZE)
-		pixel_y = board_y + (mino_y * self.MINO_SIZE)
-
-		pygame.draw.rect(spritebatch, color, (pixel_x+1, pixel_y+1, self.MINO_SIZE-1, self.MINO_SIZE-1))
+		spritebatch.blit(self.sprites().mino(color), self.minoPixels(mino_x, mino_y, board_x, board_y))
 
 	def drawGhostMino(self, spritebatch, mino_x, mino_y, color, board_x, board_y):
 		# same as drawMino except draws the outlines of the minos instead
-		pixel_x = board_x + (mino_x * self.MINO_SIZE)
-		pixel_y = board_y + (mino_y * self.MINO_SIZE)
-
-		pygame.draw.rect(spritebatch, color, (pixel_x+1, pixel_y+1, self.MINO_SIZE-1, self.MINO_SIZE-1), 1)
+		spritebatch.blit(self.sprites().ghost(color), self.minoPixels(mino_x, mino_y, board_x, board_y))
 
 	def drawPentomino(self, spritebatch, pentomino, board_x, board_y):
-		template = pentomino.getCurrentTemplate()
-
-		for y in range(len(template)):
-			for x in range(len(template[0])):
-				if (template[y][x] != self.EMPTY):
-					self.drawMino(spritebatch, x + pentomino.x, y + pentomino.y, pentomino.color, board_x, board_y)
+		spritebatch.blits(self.pentominoBlits(pentomino, board_x, board_y), False)
 
 	def drawGhostPentomino(self, spritebatch, pentomino, board_x, board_y):
 		# draws the pentomino ghost at the location at which if the user were to hard drop
-		pentomino_copy = copy.deepcopy(pentomino)
-
-		while self.isPentominoValid(pentomino_copy):
-			pentomino_copy.moveDown()
-
-		pentomino_copy.moveUp()
-		template = pentomino.getCurrentTemplate()
-
-		for y in range(len(template)):
-			for x in range(len(template[0])):
-				if (template[y][x] != self.EMPTY):
-					self.drawGhostMino(spritebatch, x + pentomino_copy.x, y + pentomino_copy.y, 
-						self.GRAY, board_x, board_y)
-
+		spritebatch.blits(self.ghostBlits(pentomino, board_x, board_y), False)
 
 	def drawPentominoPixels(self, spritebatch, pentomino, pixel_x, pixel_y):
-		template = pentomino.getCurrentTemplate()
-
-		for y in range(len(template)):
-			for x in range(len(template[0])):
-				if (template[y][x] != self.EMPTY):
-					pygame.draw.rect(spritebatch, pentomino.color,
-						(x * self.MINO_SIZE + pixel_x+1, y * self.MINO_SIZE + pixel_y+1, 
-							self.MINO_SIZE-1, self.MINO_SIZE-1))
-
+		sprite = self.sprites().mino(pentomino.color)
+		size = self.MINO_SIZE
+		spritebatch.blits([(sprite, (x * size + pixel_x+1, y * size + pixel_y+1))
+			for x, y in pentomino.getCurrentTemplate().cells], False)
+
+	# The *Blits methods return (sprite, position) pairs for Surface.blits(), so
+	# callers can batch several pieces of the board into a single call.
+
+	def rowBlits(self, y, board_x, board_y):
+		sprites = self.sprites()
+		row = self.board[y]
+		return [(sprites.mino(row[x]), self.minoPixels(x, y, board_x, board_y))
+			for x in range(self.BOARD_WIDTH) if row[x] != self.EMPTY]
+
+	def pentominoBlits(self, pentomino, board_x, board_y):
+		sprite = self.sprites().mino(pentomino.color)
+		return [(sprite, self.minoPixels(x + pentomino.x, y + pentomino.y, board_x, board_y))
+			for x, y in pentomino.getCurrentTemplate().cells]
+
+	def ghostBlits(self, pentomino, board_x, board_y):
+		sprite = self.sprites().ghost(self.GRAY)
+		ghost_y = self.ghostY(pentomino)
+		return [(sprite, self.minoPixels(x + pentomino.x, y + ghost_y, board_x, board_y))
+			for x, y in pentomino.getCurrentTemplate().cells]
+
+	def minoPixels(self, mino_x, mino_y, board_x, board_y):
+		# pixel location of the sprite of the mino at the given board indices
+		return (board_x + (mino_x * self.MINO_SIZE) + 1, board_y + (mino_y * self.MINO_SIZE) + 1)
+
+	def sprites(self):
+		# the pre-rendered mino sprites for the current MINO_SIZE
+		from sprites import spritesFor
+		return spritesFor(self.MINO_SIZE)
 
 	def isOnTheBoard(self, x, y):
 		return x >= 0 and x < self.BOARD_WIDTH and y < self.BOARD_HEIGHT
 
-	def isPentominoValid(self, pentomino):
+	def isPentominoValid(self, pentomino, dx = 0, dy = 0, drot = 0):
 		# checks whether the supposed pentomino can be drawn on the board in its current stae
 		# if any mino is out of bounds or is colliding with an existing mino, then returns False
-		template = pentomino.getCurrentTemplate()
+		# minos above the top of the board are allowed (pieces spawn partially hidden)
+		# dx, dy and drot probe a move (drot = 1 is one clockwise turn) without making it
+		shape = pentomino.shape
+		template = shape[(pentomino.rotation + drot) % len(shape)] if drot else shape[pentomino.rotation]
+		return self.fits(template, pentomino.x + dx, pentomino.y + dy)
+
+	def fits(self, template, x, y):
+		# same as isPentominoValid, for a compiled template placed at (x, y)
+		left = x + template.left
+		if left < 0 or x + template.right >= self.BOARD_WIDTH:
+			return False
+		if y + template.bottom >= self.BOARD_HEIGHT:
+			return False
+
+		# nothing above the top row can collide
+		if y + template.bottom < self.top:
+			return True
+
+		rows = self.rows
+		for dy, mask in template.rowMasks:
+			row = y + dy
+			if row >= 0 and rows[row] & (mask << left):
+				return False
 
-		for y in range(len(template)):
-			for x in range(len(template[0])):
+		return True
 
-				if (template[y][x] == self.EMPTY):
-					continue
+	def ghostY(self, pentomino):
+		# the row the pentomino would land on if it were hard dropped. The result is
+		# cached on the piece until it moves, rotates or the board changes.
+		key = (pentomino.x, pentomino.y, pentomino.rotation, self.version)
+		ghost = pentomino.ghost
+		if ghost is not None and ghost[0] == key:
+			return ghost[1]
+
+		y = self.dropY(pentomino.getCurrentTemplate(), pentomino.x, pentomino.y)
+		pentomino.ghost = (key, y)
+		return y
+
+	def dropY(self, template, x, y):
+		# the row a template at (x, y) comes to rest on when dropped straight down
+		tops = self.tops
+		landing = self.BOARD_HEIGHT
+
+		# while every column's lowest mino is above the skyline, the drop distance
+		# follows from the skyline alone
+		for dx, dy in template.columnBottoms:
+			top = tops[x + dx]
+			if y + dy >= top:      # tucked under an overhang, walk down instead
+				while self.fits(template, x, y + 1):
+					y += 1
+				return y
+			landing = min(landing, top - 1 - dy)
+
+		return landing
 
-				mino_x = pentomino.x + x
-				mino_y = pentomino.y + y
+	def addPentominoToBoard(self, pentomino):
+		# Permanently adds the specified pentomino to the board!
 
-				# TEMP BUG FIX: sometimes mino_y is -1 for some reason
-				if mino_y == -1:
-					continue
+		if not self.isPentominoValid(pentomino):
+			raise ValueError("pentomino cannot fit on the board!")
 
-				if not self.isOnTheBoard(mino_x, mino_y):
-					return False
+		board = self.board
+		shared = self.shared
+		keys = self.keys.cells
+		for x, y in pentomino.getCurrentTemplate().cells:
+			mino_x = pentomino.x + x
+			mino_y = pentomino.y + y
+			if mino_y < 0:   # minos still above the board are dropped
+				continue
+
+			if shared[mino_y]:    # copy on write
+				board[mino_y] = list(board[mino_y])
+				shared[mino_y] = 0
+
+			board[mino_y][mino_x] = pentomino.color
+			self.rows[mino_y] |= 1 << mino_x
+			self.hash ^= keys[mino_y][mino_x]
+			if mino_y < self.tops[mino_x]:
+				self.tops[mino_x] = mino_y
+				if mino_y < self.top:
+					self.top = mino_y
+
+		self.version += 1
+
+	def snapshot(self):
+		# A BoardSnapshot of the current contents. The rows are shared with the board
+		# rather than copied: the board copies a row before it next changes it.
+		if self.sparse:
+			self.shared = SparseRows(self.BOARD_HEIGHT, 1)
+			return BoardSnapshot(self.board.copy(), self.rows.copy(), tuple(self.tops), self.top, self.hash)
+
+		self.shared[:] = bytes([1]) * self.BOARD_HEIGHT
+		return BoardSnapshot(tuple(self.board), tuple(self.rows), tuple(self.tops), self.top, self.hash)
+
+	def restore(self, snapshot):
+		# brings the board back to a snapshot, which can be restored again later
+		if self.sparse:
+			self.board = snapshot.board.copy()
+			self.rows = snapshot.rows.copy()
+			self.shared = SparseRows(self.BOARD_HEIGHT, 1)
+		else:
+			self.board = list(snapshot.board)
+			self.rows = list(snapshot.rows)
+			self.shared[:] = bytes([1]) * self.BOARD_HEIGHT
+		self.tops = list(snapshot.tops)
+		self.top = snapshot.top
+		self.hash = snapshot.hash
+		self.version += 1
+
+	def reachablePlacements(self, pentomino):
+		# Lists every final resting spot the pentomino can reach from where it is now
+		# by moving left, right, down and rotating either way, including tucks and spins.
+		# Returns Placements whose path is the shortest action sequence getting there.
+		shape = pentomino.shape
+		rotations = len(shape)
+		fits = self.fits
 
-				if self.board[mino_y][mino_x] != self.EMPTY:
-					return False
+		if not self.isPentominoValid(pentomino):
+			return []
 
-		return True
+		# Above the highest mino only the walls matter, so every state there is reached
+		# just as well by first dropping straight down. Start the search from there.
+		start_y = max(pentomino.y, self.top - 1 - max(template.bottom for template in shape))
+		prefix = (actions.SOFT_DROP,) * (start_y - pentomino.y)
 
-	def addPentominoToBoard(self, pentomino):
-		# Permanently adds the specified pentomino to the board!
+		# states (x, y, rotation) are numbered into a flat visited table
+		x_min = -max(template.right for template in shape)
+		span_x = self.BOARD_WIDTH - x_min
+		span_y = self.BOARD_HEIGHT - start_y
 
-		if not self.isPentominoValid(pentomino):
-			raise ValueError("pentomino cannot fit on the board!")
+		visited = bytearray(span_x * span_y * rotations)
+		parent = array("i", bytes(4 * len(visited)))
+		move = bytearray(len(visited))
+
+		moves = ((actions.LEFT, -1, 0, 0), (actions.RIGHT, 1, 0, 0), (actions.SOFT_DROP, 0, 1, 0),
+				(actions.ROTATE_CW, 0, 0, 1), (actions.ROTATE_CCW, 0, 0, -1))
 
-		template = pentomino.getCurrentTemplate()
+		start = (pentomino.x, start_y, pentomino.rotation)
+		start_index = (pentomino.x - x_min) * rotations + pentomino.rotation
+		visited[start_index] = 1
+		queue = [start]
+		placements = []
+
+		for x, y, rotation in queue:   # the queue grows while it is walked, breadth first
+			current = ((y - start_y) * span_x + (x - x_min)) * rotations + rotation
+
+			if not fits(shape[rotation], x, y + 1):
+				placements.append((x, y, rotation, current))
+
+			for action, dx, dy, drot in moves:
+				nx, ny, nrot = x + dx, y + dy, (rotation + drot) % rotations
+				if not fits(shape[nrot], nx, ny):
+					continue
+
+				state = ((ny - start_y) * span_x + (nx - x_min)) * rotations + nrot
+				if visited[state]:
+					continue
 
-		for y in range(len(template)):
-			for x in range(len(template[0])):
-				if (template[y][x] != self.EMPTY):
-					self.board[pentomino.y + y][pentomino.x + x] = pentomino.color
\ No newline at end of file
+				visited[state] = 1
+				parent[state] = current
+				move[state] = action
+				queue.append((nx, ny, nrot))
+
+		result = []
+		for x, y, rotation, state in placements:
+			path = []
+			while state != start_index:
+				path.append(move[state])
+				state = parent[state]
+			path.reverse()
+			result.append(Placement(x, rotation, y, prefix + tuple(path)))
+
+		return result
+
+
+class BoardSnapshot:
+	# the contents of a Board at one point in time, see Board.snapshot. Never modified.
+
+	__slots__ = ("board", "rows", "tops", "top", "hash")
+
+	def __init__(self, board, rows, tops, top, hash):
+		self.board = board      # the board's row lists, shared copy-on-write
+		self.rows = rows
+		self.tops = tops
+		self.top = top
+		self.hash = hash
+
+
+class SparseRows(dict):
+	# The rows of a sparse Board: indexed like a list of `height` rows, but only
+	# the rows that differ from `default` are stored, as a dict keyed by row
+	# index. Setting a row to the default drops it. Looking up a stored row is
+	# a plain dict lookup, as collision checks do it constantly.
+
+	__slots__ = ("height", "default")
+
+	def __init__(self, height, default, rows = ()):
+		dict.__init__(self, rows)
+		self.height = height
+		self.default = default
+
+	def __missing__(self, y):
+		return self.default
+
+	def __setitem__(self, y, value):
+		if value == self.default:
+			self.pop(y, None)
+		else:
+			dict.__setitem__(self, y, value)
+
+	def __len__(self):
+		return self.height
+
+	def __iter__(self):
+		# every row, as a list would; visits the whole height, so avoid it on hot paths
+		for y in range(self.height):
+			yield self[y]
+
+	def stored(self):
+		# how many rows are actually stored
+		return dict.__len__(self)
+
+	def first(self):
+		# index of the highest stored row, height if there are none
+		return min(self.keys(), default = self.height)
+
+	def shift(self, dy):
+		# moves every row by dy, dropping those that leave the board
+		moved = [(y + dy, value) for y, value in self.items() if 0 <= y + dy < self.height]
+		self.clear()
+		dict.update(self, moved)
+
+	def copy(self, function = None):
+		# a copy of the rows, each one passed through function if given
+		if function is None:
+			return SparseRows(self.height, self.default, self.items())
+		return SparseRows(self.height, self.default, ((y, function(value)) for y, value in self.items()))
@@ -0,0 +1,57 @@
+""" Compact binary encoding helpers shared by the replay and network code.
+
+Unsigned integers are written as LEB128 varints (7 bits per byte, high bit set
+on every byte but the last), so small numbers take a single byte. Signed
+integers are zigzag-mapped first (0, -1, 1, -2, ... become 0, 1, 2, 3, ...).
+"""
+
+
+def encodeVarint(value):
+	if value < 0:
+		raise ValueError("varints must not be negative, zigzag-encode signed values")
+
+	out = bytearray()
+	while value > 0x7f:
+		out.append((value & 0x7f) | 0x80)
+		value >>= 7
+	out.append(value)
+	return bytes(out)
+
+def decodeVarint(data, offset = 0):
+	# returns (value, offset just past the varint)
+	value = 0
+	shift = 0
+	while True:
+		if offset >= len(data):
+			raise EOFError("truncated varint")
+		byte = data[offset]
+		offset += 1
+		value |= (byte & 0x7f) << shift
+		if not byte & 0x80:
+			return value, offset
+		shift += 7
+
+def readVarint(stream):
+	# reads a varint from a binary file object, None at a clean end of file
+	value = 0
+	shift = 0
+	while True:
+		byte = stream.read(1)
+		if not byte:
+			if shift:
+				raise EOFError("truncated varint")
+			return None
+		value |= (byte[0] & 0x7f) << shift
+		if not byte[0] & 0x80:
+			return value
+		shift += 7
+
+def zigzag(value):
+	return (value << 1) if value >= 0 else ((-value << 1) - 1)
+
+def unzigzag(value):
+	return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+def encodeString(text):
+	data = text.encode("utf-8")
+	return encodeVarint(len(data)) + data
@@ -0,0 +1,108 @@
+""" Fixed-timestep driver of an Engine. The Controller turns held keys into
+engine actions one logic tick at a time: gravity, the auto-shift delay and
+auto-repeat rate of sideways moves (DAS and ARR) and soft drop repeat are all
+counted in ticks (see Engine.fallTicks and friends) instead of being measured
+against the wall clock.
+
+The front end runs a whole number of ticks per frame from an accumulator and
+draws in between; headless code simply calls tick() in a loop, so a game can
+be sped up, slowed down or single-stepped without changing how it plays.
+"""
+
+import actions
+
+
+class Controller:
+
+	def __init__(self, engine):
+		self.engine = engine
+		self.ticks = 0             # logic ticks run so far
+
+		self.shift = None          # LEFT or RIGHT while a sideways key is held
+		self.shiftTimer = 0        # ticks until the next auto-shift
+		self.softDropping = False
+		self.dropTimer = 0         # ticks until the next soft drop
+		self.gravityTimer = 0      # ticks since the piece last fell by itself
+
+		self.otherShift = None     # the opposite key, if it is held underneath
+		self.previous = None       # (piece, x, y, rotation) at the start of the last tick
+
+	def press(self, action):
+		# A key went down: the action happens right away. Sideways moves and soft
+		# drops keep repeating while the key is held. Returns True if the action
+		# had an effect.
+		if action == actions.LEFT or action == actions.RIGHT:
+			if self.shift is not None and self.shift != action:
+				self.otherShift = self.shift    # the newest direction wins until it is released
+			self.shift = action
+			self.shiftTimer = self.engine.AUTO_SHIFT_DELAY
+		elif action == actions.SOFT_DROP:
+			self.softDropping = True
+			self.dropTimer = self.engine.softDropTicks()
+
+		return self.engine.step(action)
+
+	def release(self, action):
+		if action == actions.LEFT or action == actions.RIGHT:
+			if self.otherShift == action:
+				self.otherShift = None
+			elif self.shift == action:
+				# fall back to the other direction if it is still held
+				self.shift, self.otherShift = self.otherShift, None
+				self.shiftTimer = self.engine.AUTO_SHIFT_DELAY
+		elif action == actions.SOFT_DROP:
+			self.softDropping = False
+
+	def tick(self):
+		# Advances the game by one logic tick. Returns True if a piece was locked.
+		engine = self.engine
+		self.ticks += 1
+		if engine.recorder is not None:
+			engine.recorder.frame = self.ticks   # replays are timed in ticks
+
+		if engine.gameOver:
+			return False
+
+		piece = engine.currentPiece
+		self.previous = (piece, piece.x, piece.y, piece.rotation)
+		placed = engine.piecesPlaced
+
+		if self.shift is not None:
+			self.shiftTimer -= 1
+			if self.shiftTimer <= 0:
+				engine.step(self.shift)
+				self.shiftTimer = engine.autoRepeatTicks()
+
+		if self.softDropping:
+			self.dropTimer -= 1
+			if self.dropTimer <= 0:
+				engine.step(actions.SOFT_DROP)
+				self.dropTimer = engine.softDropTicks()
+
+		# let the piece fall by itself, locking it and clearing any complete lines once it lands
+		self.gravityTimer += 1
+		if self.gravityTimer >= engine.fallTicks():
+			self.gravityTimer = 0
+			engine.step(actions.GRAVITY)
+
+		return engine.piecesPlaced != placed
+
+	def interpolate(self, alpha):
+		# Fraction of a cell (dx, dy) to draw the current piece away from where it
+		# is, blending its position at the start of the last tick towards its
+		# current one by alpha (0 to 1). Jumps of more than one cell, rotations and
+		# new pieces are not blended.
+		if self.previous is None:
+			return 0.0, 0.0
+
+		piece, x, y, rotation = self.previous
+		current = self.engine.currentPiece
+		if piece is not current or rotation != current.rotation:
+			return 0.0, 0.0
+
+		dx = current.x - x
+		dy = current.y - y
+		if abs(dx) > 1 or abs(dy) > 1:
+			return 0.0, 0.0
+
+		return (alpha - 1) * dx, (alpha - 1) * dy
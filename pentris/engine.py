@@ -0,0 +1,353 @@
+""" Headless simulation core of pentris. The Engine owns the board, the current,
+next and hold pieces and the score, level and line counters, and advances the
+game one action at a time (see actions.py). It never touches pygame or the
+wall clock, so it can be driven by the front end in pentris.py, by bots, or by
+scripts running many games as fast as the CPU allows.
+
+Given the same seed and the same sequence of actions, an Engine always ends up
+in the same state. snapshot() saves that state as a GameState and restore()
+rewinds to one, for undo and lookahead; stateHash() is a Zobrist hash of the
+board, the falling piece and the hold slot (see zobrist.py).
+"""
+
+import actions
+import zobrist
+from board import Board
+from factory import Factory
+from gamestate import GameState
+from pentomino import Pentomino
+
+
+class Engine:
+
+	START_Y = -1
+
+	# points for clearing 0, 1, 2, 3, 4 and 5 lines at once, multiplied by (level+1)
+	LINE_SCORES = (0, 1000, 3500, 7000, 15000, 35000)
+
+	LINES_PER_LEVEL = 5
+
+	# garbage lines sent to an opponent for clearing 0, 1, 2, 3, 4 and 5 lines at once
+	GARBAGE_LINES = (0, 0, 1, 2, 4, 6)
+
+	def __init__(self, board_width = 14, board_height = 24, mino_size = 0, seed = None,
+				randomizer = "bag", preview = 1, sparse = False, order = 5):
+		# mino_size is only needed when the board is also drawn. seed, randomizer,
+		# preview and order (minos per piece) are passed on to the Factory, which
+		# holds all of the game's randomness; a random seed is picked if none is
+		# given. sparse picks the Board storage meant for very tall boards.
+		self.board = Board(board_width, board_height, mino_size, sparse)
+		self.factory = Factory(seed, randomizer, preview, order)
+		self.seed = self.factory.seed
+		self.START_X = (board_width - order + 1) // 2
+
+		self.level = 0
+		self.score = 0
+		self.lines = 0
+		self.piecesPlaced = 0
+		self.lastCleared = 0      # lines cleared by the most recent lock
+		self.lastClearedRows = []
+		self.gameOver = False
+
+		self.currentPiece = self.newPiece()
+		self.nextPiece = self.newPiece()
+		self.holdPiece = None
+		self.usedHold = False     # set to True once the current piece has been held
+
+		# garbage lines waiting to be raised, as [lines, hole column] (see addGarbage)
+		self.pendingGarbage = []
+		self.garbageSent = 0      # garbage lines this player has sent in total
+
+		# optional object told about every action that changes the game (see replay.py)
+		self.recorder = None
+
+		# optional Profiler timing the line clears (see profiler.py)
+		self.profiler = None
+
+	def newPiece(self):
+		return Pentomino(self.factory.obtainShape(), self.factory.obtainColor(Board.COLORS),
+			self.START_X, self.START_Y)
+
+	# Speeds for the current level, in logic ticks. The front end runs the game at
+	# TICKS_PER_SECOND ticks per second (see controls.py), so gravity and key
+	# repeat don't depend on how long a frame took to draw.
+
+	TICKS_PER_SECOND = 60
+
+	AUTO_SHIFT_DELAY = 10    # ticks a sideways key is held before it starts repeating
+
+	def ticks(self, seconds):
+		return max(round(seconds * self.TICKS_PER_SECOND), 1)
+
+	def fallTicks(self):
+		# how many ticks pass for the piece to auto-fall one space
+		return self.ticks(max(1.00 - self.level * 0.08, 0.03))
+
+	def autoRepeatTicks(self):
+		# delay to keep moving a pentomino sideways once auto shift has kicked in
+		return self.ticks(0.12 - self.level * 0.01)
+
+	def softDropTicks(self):
+		# delay to keep soft dropping a pentomino
+		return self.ticks(0.06 - self.level * 0.01)
+
+	def step(self, action):
+		# Applies a single action to the current piece. Returns True if the action
+		# had an effect (the piece moved, rotated, locked or was held).
+		changed = self.applyAction(action)
+		if changed and self.recorder is not None:
+			self.recorder.recordAction(action)
+		return changed
+
+	def applyAction(self, action):
+		if self.gameOver:
+			return False
+
+		board = self.board
+		piece = self.currentPiece
+
+		# every move is probed on the board before the piece is touched
+		if action == actions.LEFT:
+			if not board.isPentominoValid(piece, dx = -1):
+				return False
+			piece.moveLeft()
+
+		elif action == actions.RIGHT:
+			if not board.isPentominoValid(piece, dx = 1):
+				return False
+			piece.moveRight()
+
+		elif action == actions.SOFT_DROP:
+			if not board.isPentominoValid(piece, dy = 1):
+				return False
+			piece.moveDown()
+			self.score += 1
+
+		elif action == actions.HARD_DROP:
+			self.score += 2 * self.dropPiece()
+			self.lockPiece()
+
+		elif action == actions.ROTATE_CW:
+			if not board.isPentominoValid(piece, drot = 1):
+				return False
+			piece.rotateClockwise()
+
+		elif action == actions.ROTATE_CCW:
+			if not board.isPentominoValid(piece, drot = -1):
+				return False
+			piece.rotateCounterclockwise()
+
+		elif action == actions.HOLD:
+			return self.hold()
+
+		elif action == actions.GRAVITY:
+			if board.isPentominoValid(piece, dy = 1):
+				piece.moveDown()
+			else:
+				self.lockPiece()
+
+		else:
+			raise ValueError("unknown action: %r" % (action,))
+
+		return True
+
+	def hardDropTo(self, placement, trusted = False):
+		# Moves the current piece straight to the given Placement and locks it there.
+		# With placement.y set the piece is put at exactly that spot, which must be
+		# valid and resting on something; otherwise it is dropped from its current row.
+		# Either way the spot must be reachable from where the piece is (see
+		# Board.reachablePlacements). If placement.hold is set the piece is swapped
+		# with the hold slot first. An invalid placement raises ValueError before
+		# anything is recorded or changed. trusted skips the reachability search,
+		# for placements that came out of it.
+		if self.gameOver:
+			return False
+
+		if placement.hold:
+			if self.usedHold:
+				raise ValueError("hold was already used for this piece!")
+			# the placement is for the piece the hold brings in, where it will spawn
+			incoming = self.holdPiece if self.holdPiece is not None else self.nextPiece
+			piece = Pentomino(incoming.shape, incoming.color, self.START_X, self.START_Y)
+			spawns = self.board.isPentominoValid(piece)
+		else:
+			piece = self.currentPiece
+			spawns = True
+
+		if spawns:    # otherwise holding tops out, there is nothing to place
+			y = self.checkPlacement(piece, placement, trusted)
+
+		if self.recorder is not None:
+			self.recorder.recordPlacement(placement)
+
+		if placement.hold:
+			self.hold()
+			if self.gameOver:
+				return False
+
+		piece = self.currentPiece
+		start_y = piece.y
+		piece.rotation = placement.rotation % len(piece.shape)
+		piece.x = placement.x
+		piece.y = y
+
+		self.dropPiece()
+		self.score += 2 * max(piece.y - start_y, 0)
+		self.lockPiece()
+		return True
+
+	def checkPlacement(self, piece, placement, trusted = False):
+		# Raises ValueError unless hardDropTo may put the piece at the placement;
+		# returns the row the piece is dropped from.
+		board = self.board
+		rotation = placement.rotation % len(piece.shape)
+		template = piece.shape[rotation]
+		y = piece.y if placement.y is None else placement.y
+
+		if not board.fits(template, placement.x, y):
+			raise ValueError("placement cannot fit on the board!")
+
+		if placement.y is None:
+			landing = board.dropY(template, placement.x, y)
+		elif board.fits(template, placement.x, y + 1):
+			raise ValueError("placement is not resting on anything!")
+		else:
+			landing = y
+
+		if not trusted and not any(spot.x == placement.x and spot.y == landing and spot.rotation == rotation
+				for spot in board.reachablePlacements(piece)):
+			raise ValueError("placement cannot be reached from where the piece is!")
+
+		return y
+
+	def dropPiece(self):
+		# moves the current piece as far down as it goes, returns the number of rows
+		piece = self.currentPiece
+		y = self.board.ghostY(piece)
+		distance = y - piece.y
+		piece.y = y
+		return distance
+
+	def lockPiece(self):
+		# permanently adds the current piece to the board, clears lines and spawns the next piece
+		board = self.board
+		piece = self.currentPiece
+
+		board.addPentominoToBoard(piece)
+		self.piecesPlaced += 1
+		self.usedHold = False
+
+		# a piece locked partially above the board tops the player out
+		if piece.y + piece.getCurrentTemplate().top < 0:
+			self.gameOver = True
+
+		# indices, for animations and garbage
+		if self.profiler is None:
+			self.lastClearedRows = board.clearCompleteLines()
+		else:
+			self.lastClearedRows = self.profiler.call("lines", board.clearCompleteLines)
+		lines_cleared = len(self.lastClearedRows)
+		self.lastCleared = lines_cleared
+		self.lines += lines_cleared
+		self.score += self.LINE_SCORES[min(lines_cleared, 5)] * (self.level+1)
+
+		# calculate increases in level and difficulty, if necessary
+		self.level = self.lines // self.LINES_PER_LEVEL
+
+		# cleared lines cancel incoming garbage first, and whatever is left of the
+		# attack is sent; garbage that wasn't cancelled rises when nothing was cleared
+		attack = self.GARBAGE_LINES[min(lines_cleared, 5)]
+		while attack and self.pendingGarbage:
+			cancelled = min(attack, self.pendingGarbage[0][0])
+			attack -= cancelled
+			self.pendingGarbage[0][0] -= cancelled
+			if not self.pendingGarbage[0][0]:
+				self.pendingGarbage.pop(0)
+		self.garbageSent += attack
+
+		if not lines_cleared:
+			for lines, hole in self.pendingGarbage:
+				if not board.addGarbageLines(lines, hole):
+					self.gameOver = True
+			self.pendingGarbage = []
+
+		self.spawnPiece(self.nextPiece)
+		self.nextPiece = self.newPiece()
+
+	def spawnPiece(self, piece):
+		# makes the given piece the current one, at its starting location
+		piece.x = self.START_X
+		piece.y = self.START_Y
+		piece.rotation = 0
+		self.currentPiece = piece
+
+		# new piece can't fit on the board, game over!
+		if not self.board.isPentominoValid(piece):
+			self.gameOver = True
+
+	def addGarbage(self, lines, hole):
+		# queues garbage from an opponent, raised when the current piece locks
+		# without clearing lines (see lockPiece)
+		if lines > 0:
+			self.pendingGarbage.append([lines, hole])
+
+	def hold(self):
+		# swaps the current piece with the hold slot, once per falling piece
+		if self.usedHold:
+			return False
+
+		self.usedHold = True
+		held = self.holdPiece
+		self.holdPiece = self.currentPiece
+		self.holdPiece.rotation = 0    # reset piece orientation
+
+		if held is None:
+			held = self.nextPiece
+			self.nextPiece = self.newPiece()
+
+		self.spawnPiece(held)
+		return True
+
+	def stateHash(self):
+		piece = self.currentPiece
+		hold = self.holdPiece.shape if self.holdPiece is not None else None
+		return (self.board.hash ^ zobrist.pieceKey(piece.shape, piece.rotation, piece.x, piece.y)
+			^ zobrist.holdKey(hold))
+
+	def snapshot(self):
+		# the whole game as a GameState; the board rows are shared, not copied
+		pieces = tuple((piece.shape, piece.color, piece.x, piece.y, piece.rotation) if piece is not None
+			else None for piece in (self.currentPiece, self.nextPiece, self.holdPiece))
+
+		return GameState(board = self.board.snapshot(), factory = self.factory.snapshot(),
+			pieces = pieces, usedHold = self.usedHold, level = self.level, score = self.score,
+			lines = self.lines, piecesPlaced = self.piecesPlaced, lastCleared = self.lastCleared,
+			lastClearedRows = list(self.lastClearedRows), gameOver = self.gameOver,
+			pendingGarbage = [list(garbage) for garbage in self.pendingGarbage],
+			garbageSent = self.garbageSent, hash = self.stateHash())
+
+	def restore(self, state):
+		# rewinds the game to a GameState from snapshot(), which can be restored again later
+		self.board.restore(state.board)
+		self.factory.restore(state.factory)
+
+		pieces = []
+		for saved in state.pieces:
+			piece = None
+			if saved is not None:
+				shape, color, x, y, rotation = saved
+				piece = Pentomino(shape, color, x, y)
+				piece.rotation = rotation
+			pieces.append(piece)
+		self.currentPiece, self.nextPiece, self.holdPiece = pieces
+
+		self.usedHold = state.usedHold
+		self.level = state.level
+		self.score = state.score
+		self.lines = state.lines
+		self.piecesPlaced = state.piecesPlaced
+		self.lastCleared = state.lastCleared
+		self.lastClearedRows = list(state.lastClearedRows)
+		self.gameOver = state.gameOver
+		self.pendingGarbage = [list(garbage) for garbage in state.pendingGarbage]
+		self.garbageSent = state.garbageSent
@@ -3,231 +3,150 @@ Helper class to manage random generation of pentominos. The naming scheme of
 pentomino shapes is used as follows: F, F', I, L, J, N, N', P, Q, T, U, V, 
 W, X, Y, Y', Z, S.
 
-With the 18 possible shapes, this class ensures that each set of 18 generated
-shapes will have one of each possible shape.
+With the 18 possible shapes, the default randomizer ensures that each set of 18
+generated shapes will have one of each possible shape. Other randomizers can
+be plugged in (see RANDOMIZERS). A Factory can also deal pieces of another
+size (order 4 for tetrominoes, 6 for hexominoes...).
+
+A Factory owns its random generator, created from a single seed, and all of the
+randomness of a game (shapes and colors) should come from it so the game can be
+reproduced from that seed. The next shapes are kept in a fixed-size ring
+buffer so they can be previewed. snapshot() and restore() save and rewind all
+of that state, for undo and lookahead.
+
+The shapes and their rotations are generated rather than typed in (see
+polyomino.py); SHAPES holds the compiled pentominoes, read from the table
+shipped with the game.
 """
 
-from random import shuffle, randrange
+import random
+from collections import deque
 
-class Factory:
+import polyomino
 
-	F_SHAPE = [["..OO.",
-				".OO..",
-				"..O.."],
-			   ["..O..",
-			    ".OOO.",
-			    "...O."],
-			   ["..O..",
-			   	"..OO.",
-			   	".OO.."],
-			   [".O...",
-			    ".OOO.",
-			    "..O.."]]
-
-	F_PRIME_SHAPE = [[".OO..",
-					  "..OO.",
-					  "..O.."],
-					 ["...O.",
-					  ".OOO.",
-					  "..O.."],
-					 ["..O..",
-					  ".OO..",
-					  "..OO."],
-					 ["..O..",
-					  ".OOO.",
-					  ".O..."]]
-
-	I_SHAPE = [[".OOOOO."],
-			   [".O.",
-			    ".O.",
-			    ".O.",
-			    ".O.",
-			    ".O."]]
-
-	L_SHAPE = [["....O.",
-				".OOOO."],
-			   [".O..",
-			    ".O..",
-			    ".O..",
-			    ".OO."],
-			   [".OOOO.",
-			    ".O...."],
-			   [".OO.",
-			    "..O.",
-			    "..O.",
-			    "..O."]]
-
-	J_SHAPE = [[".O....",
-				".OOOO."],
-			   [".OO.",
-			    ".O..",
-			    ".O..",
-			    ".O.."],
-			   [".OOOO.",
-			    "....O."],
-			   ["..O.",
-			    "..O.",
-			    "..O.",
-			    ".OO."]]
-
-	N_SHAPE = [[".OOO..",
-	            "...OO."],
-	           ["..O.",
-	            "..O.",
-	            ".OO.",
-	            ".O.."],
-	           [".OO...",
-	            "..OOO."],
-	           ["..O.",
-	            ".OO.",
-	            ".O..",
-	            ".O.."]]
-
-	N_PRIME_SHAPE = [["..OOO.",
-					  ".OO..."],
-					 [".O..",
-					  ".OO.",
-					  "..O.",
-					  "..O."],
-					 ["...OO.",
-					  ".OOO.."],
-					 [".O..",
-					  ".O..",
-					  ".OO.",
-					  "..O."]]
-
-	P_SHAPE = [[".OO.",
-				".OO.",
-				".O.."],
-			   [".OOO.",
-			    "..OO."],
-			   ["..O.",
-			    ".OO.",
-			    ".OO."],
-			   [".OO..",
-			    ".OOO."]]
-
-	Q_SHAPE = [[".OO.",
-				".OO.",
-				"..O."],
-			   ["..OO.",
-			    ".OOO."],
-			   [".O..",
-			    ".OO.",
-			    ".OO."],
-			   [".OOO.",
-			    ".OO.."]]
-
-	T_SHAPE = [["..O..",
-			    "..O..",
-			    ".OOO."],
-			   [".O...",
-			    ".OOO.",
-			    ".O..."],
-			   [".OOO.",
-			    "..O..",
-			    "..O.."],
-			   ["...O.",
-			    ".OOO.",
-			    "...O."]]
-
-	U_SHAPE = [[".O.O.",
-				".OOO."],
-			   [".OO.",
-			    ".O..",
-			    ".OO."],
-			   [".OOO.",
-			    ".O.O."],
-			   [".OO.",
-			    "..O.",
-			    ".OO."]]
-
-	V_SHAPE = [[".O...",
-				".O...",
-				".OOO."],
-			   [".OOO.",
-			    ".O...",
-			    ".O..."],
-			   [".OOO.",
-			    "...O.",
-			    "...O."],
-			   ["...O.",
-			    "...O.",
-			    ".OOO."]]
-
-	W_SHAPE = [[".O...",
-				".OO..",
-				"..OO."],
-			   ["..OO.",
-			    ".OO..",
-			    ".O..."],
-			   [".OO..",
-			    "..OO.",
-			    "...O."],
-			   ["...O.",
-			    "..OO.",
-			    ".OO.."]]
-
-	X_SHAPE = [["..O..",
-				".OOO.",
-				"..O.."]]
-
-	Y_SHAPE = [["...O..",
-			    ".OOOO."],
-			   [".O..",
-			    ".O..",
-			    ".OO.",
-			    ".O.."],
-			   [".OOOO.",
-			    "..O..."],
-			   ["..O.",
-				".OO.",
-				"..O.",
-				"..O."]]
-
-	Y_PRIME_SHAPE = [["..O...",
-					  ".OOOO."],
-					 [".O..",
-					  ".OO.",
-					  ".O..",
-					  ".O.."],
-					 [".OOOO.",
-					  "...O.."],
-					 ["..O.",
-					  "..O.",
-					  ".OO.",
-					  "..O."]]
-
-	Z_SHAPE = [[".OO..",
-				"..O..",
-				"..OO."],
-			   ["...O.",
-			    ".OOO.",
-			    ".O..."]]
-
-	S_SHAPE = [["..OO.",
-				"..O..",
-				".OO.."],
-			   [".O...",
-			    ".OOO.",
-			    "...O."]]
-
-	SHAPES = [F_SHAPE, F_PRIME_SHAPE, I_SHAPE, L_SHAPE, J_SHAPE,
-		  N_SHAPE, N_PRIME_SHAPE, P_SHAPE, Q_SHAPE, T_SHAPE,
-		  U_SHAPE, V_SHAPE, W_SHAPE, X_SHAPE, Y_SHAPE,
-		  Y_PRIME_SHAPE, Z_SHAPE, S_SHAPE]
-
-
-	def __init__(self):
-		self.queue = list(self.SHAPES)
-		shuffle(self.queue)
 
-	def obtainShape(self):
-		random_index = randrange(0, len(self.queue))
-		ret = self.queue.pop(random_index)
+class BagRandomizer:
+	# deals every shape once, in a random order, before starting over
+
+	def __init__(self, shapes, rng):
+		self.shapes = shapes
+		self.random = rng
+		self.bag = []
+
+	def next(self):
+		if not self.bag:  # bag is empty!
+			self.bag = list(self.shapes)
+			self.random.shuffle(self.bag)
+		return self.bag.pop()
+
+	def state(self):
+		return tuple(self.bag)
+
+	def restore(self, state):
+		self.bag = list(state)
+
+
+class HistoryRandomizer:
+	# picks at random, but rerolls (up to a few times) shapes that were dealt recently
+
+	HISTORY = 4
+	TRIES = 6
+
+	def __init__(self, shapes, rng):
+		self.shapes = shapes
+		self.random = rng
+		self.history = deque(maxlen = self.HISTORY)
+
+	def next(self):
+		for i in range(self.TRIES):
+			shape = self.random.choice(self.shapes)
+			if shape not in self.history:
+				break
+
+		self.history.append(shape)
+		return shape
+
+	def state(self):
+		return tuple(self.history)
 
-		if not self.queue:  # queue is empty!
-			self.queue = list(self.SHAPES)
-			shuffle(self.queue)
+	def restore(self, state):
+		self.history.clear()
+		self.history.extend(state)
 
-		return ret
\ No newline at end of file
+
+class PureRandomizer:
+	# every shape is equally likely every time
+
+	def __init__(self, shapes, rng):
+		self.shapes = shapes
+		self.random = rng
+
+	def next(self):
+		return self.random.choice(self.shapes)
+
+	def state(self):
+		return None
+
+	def restore(self, state):
+		pass
+
+
+RANDOMIZERS = {"bag": BagRandomizer, "history": HistoryRandomizer, "random": PureRandomizer}
+
+
+class Factory:
+
+	# the compiled pentominoes, in the order F, F', I, L, J, N, N', P, Q, T, U, V, W, X, Y, Y', Z, S
+	SHAPES = polyomino.shapes(5)
+
+
+	def __init__(self, seed = None, randomizer = "bag", preview = 1, order = 5):
+		# seed makes the sequence of shapes and colors reproducible; a random one is
+		# picked (and kept in self.seed) if none is given. randomizer is one of the
+		# names in RANDOMIZERS or a class with the same interface, and preview is the
+		# number of upcoming shapes that can be looked at. order is the number of
+		# minos in each piece.
+		if seed is None:
+			seed = random.randrange(1 << 32)
+		self.seed = seed
+		self.random = random.Random(seed)
+
+		if isinstance(randomizer, str):
+			self.randomizerName = randomizer
+			randomizer = RANDOMIZERS[randomizer]
+		else:
+			self.randomizerName = randomizer.__name__
+		self.order = order
+		self.shapes = self.SHAPES if order == 5 else polyomino.shapes(order)
+		self.randomizer = randomizer(self.shapes, self.random)
+
+		# ring buffer of the upcoming shapes, the oldest at self.head
+		self.upcoming = [self.randomizer.next() for i in range(max(preview, 1))]
+		self.head = 0
+
+	def obtainShape(self):
+		ret = self.upcoming[self.head]
+		self.upcoming[self.head] = self.randomizer.next()
+		self.head = (self.head + 1) % len(self.upcoming)
+		return ret
+
+	def peekShape(self, i = 0):
+		# the shape that will be returned after i more calls of obtainShape
+		return self.upcoming[(self.head + i) % len(self.upcoming)]
+
+	def preview(self):
+		# all the upcoming shapes, in order
+		return self.upcoming[self.head:] + self.upcoming[:self.head]
+
+	def obtainColor(self, colors):
+		return self.random.choice(colors)
+
+	def snapshot(self):
+		# everything the next shapes and colors depend on, for restore()
+		return (self.random.getstate(), self.randomizer.state(), tuple(self.upcoming), self.head)
+
+	def restore(self, snapshot):
+		random_state, randomizer_state, upcoming, self.head = snapshot
+		self.random.setstate(random_state)
+		self.randomizer.restore(randomizer_state)
+		self.upcoming = list(upcoming)
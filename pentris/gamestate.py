@@ -0,0 +1,78 @@
+""" Saved game positions. Engine.snapshot() returns a GameState that
+Engine.restore() can rewind the game to. Board rows are shared with the live
+board copy-on-write (see Board.snapshot), so taking a snapshot is cheap enough
+to do for every piece.
+
+A TranspositionTable remembers values computed for positions, keyed on their
+Zobrist hash (see zobrist.py), and forgets the least recently used ones once
+full. An UndoStack keeps the last few GameStates of a practice game.
+"""
+
+from collections import OrderedDict, deque
+
+
+class GameState:
+	# everything an Engine needs to continue a game from one point; never modified
+
+	__slots__ = ("board", "factory", "pieces", "usedHold", "level", "score", "lines",
+				"piecesPlaced", "lastCleared", "lastClearedRows", "gameOver",
+				"pendingGarbage", "garbageSent", "hash")
+
+	def __init__(self, **values):
+		for name, value in values.items():
+			setattr(self, name, value)
+
+
+class TranspositionTable:
+
+	def __init__(self, capacity = 65536):
+		self.capacity = capacity
+		self.entries = OrderedDict()    # hash -> value, least recently used first
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, key, default = None):
+		value = self.entries.get(key, default)
+		if value is default:
+			self.misses += 1
+		else:
+			self.hits += 1
+			self.entries.move_to_end(key)
+		return value
+
+	def put(self, key, value):
+		self.entries[key] = value
+		self.entries.move_to_end(key)
+		if len(self.entries) > self.capacity:
+			self.entries.popitem(last = False)
+
+	def clear(self):
+		self.entries.clear()
+
+	def __len__(self):
+		return len(self.entries)
+
+	def stats(self):
+		lookups = self.hits + self.misses
+		return {"size": len(self.entries), "hits": self.hits, "misses": self.misses,
+			"hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class UndoStack:
+	# the last `limit` GameStates pushed, the oldest are dropped
+
+	def __init__(self, limit = 100):
+		self.states = deque(maxlen = limit)
+
+	def push(self, state):
+		self.states.append(state)
+
+	def pop(self):
+		# the most recent state, or None when there is nothing left to undo
+		return self.states.pop() if self.states else None
+
+	def clear(self):
+		self.states.clear()
+
+	def __len__(self):
+		return len(self.states)
@@ -0,0 +1,68 @@
+""" Heads-up display: the text and preview panels around the board. Rendering
+text with a font is one of the most expensive things done in a frame, so the
+Hud keeps every surface it renders in a bounded LRU cache keyed by (text,
+color). Static labels such as "Score:" are rendered once, and a number is only
+rendered again when it changes to a value not seen recently.
+
+Panels are rectangles of the window, each redrawn only when the key describing
+its contents changes. Any part of the front end can add its own panels.
+"""
+
+from collections import OrderedDict
+
+
+class Hud:
+
+	def __init__(self, font, color, background, cache_size = 64):
+		self.font = font
+		self.color = color
+		self.background = background
+		self.cacheSize = cache_size
+		self.cache = OrderedDict()    # (text, color) -> rendered surface, least recently used first
+		self.panels = {}              # name -> key of the contents last drawn
+		self.profiler = None          # optional Profiler timing the font rendering
+
+	def text(self, text, color = None):
+		# the rendered surface for the text, from the cache whenever possible
+		key = (text, color or self.color)
+		surface = self.cache.get(key)
+
+		if surface is None:
+			if self.profiler is None:
+				surface = self.font.render(text, True, key[1])
+			else:
+				surface = self.profiler.call("text", self.font.render, text, True, key[1])
+			self.cache[key] = surface
+			if len(self.cache) > self.cacheSize:
+				self.cache.popitem(last = False)
+		else:
+			self.cache.move_to_end(key)
+
+		return surface
+
+	def drawText(self, spritebatch, text, topleft, color = None):
+		# blits text with its top-left corner at topleft and returns its rectangle
+		surface = self.text(text, color)
+		rect = surface.get_rect(topleft = topleft)
+		spritebatch.blit(surface, rect)
+		return rect
+
+	def drawValue(self, spritebatch, label, value, topleft, color = None):
+		# draws "label value", with the label and the value rendered separately
+		rect = self.drawText(spritebatch, label, topleft, color)
+		return rect.union(self.drawText(spritebatch, str(value), rect.topright, color))
+
+	def panel(self, spritebatch, name, rect, key, drawFunction, *args):
+		# Redraws the named panel if key differs from the last time it was drawn:
+		# clears rect and calls drawFunction(*args). Returns the dirty rectangles.
+		if name in self.panels and self.panels[name] == key:
+			return []
+
+		self.panels[name] = key
+		spritebatch.fill(self.background, rect)
+		drawFunction(*args)
+		return [rect]
+
+	def invalidate(self):
+		# forces every panel to be redrawn on the next frame
+		self.panels.clear()
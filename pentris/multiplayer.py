@@ -0,0 +1,632 @@
+""" Local-network multiplayer: an asyncio match server and client. Players who
+connect are paired into matches of two; each player's game runs on the
+server in an Engine driven by a Controller (see controls.py), ticked at a
+fixed rate for every match at once by a single task. Clearing lines sends
+garbage to the opponent (Engine.GARBAGE_LINES), and the last player standing
+wins.
+
+Clients only send key presses and releases. After every tick the server
+sends each client a delta of both boards against what that client was last
+sent: the rows that changed, and the piece, next, hold, score and pending
+garbage only when they differ. A client whose connection is backed up is
+skipped for a tick and catches up with a larger delta later, so a slow
+player never holds up the tick of the others.
+
+Messages are a varint length followed by the payload, whose first byte is
+the message type; all numbers are varints (see codec.py).
+
+	python multiplayer.py server --port 7777
+	python multiplayer.py bot --port 7777            # a computer opponent
+	python multiplayer.py loadtest --matches 24      # server and bots in one process
+"""
+
+import argparse, asyncio, multiprocessing, random, time
+
+import actions
+from ai import AI, place
+from board import Board
+from codec import encodeVarint, decodeVarint, zigzag, unzigzag, encodeString
+from controls import Controller
+from engine import Engine
+from factory import Factory
+from pentomino import Pentomino
+from profiler import RingBuffer
+import zobrist
+
+# client to server
+JOIN = 1          # player name
+PRESS = 2         # action
+RELEASE = 3       # action
+
+# the actions a client may press and release; gravity is the server's
+CLIENT_ACTIONS = frozenset(range(actions.LEFT, actions.HOLD + 1))
+
+# server to client
+START = 10        # player index, seed, board width, board height, opponent name
+STATE = 11        # tick, then a board delta for player 0 and for player 1
+END = 12          # index of the winner, 2 for a draw
+
+# what a board delta holds, as bit flags
+ROWS = 1          # number of rows, then for each: y, occupancy mask, a color byte per mino
+PIECE = 2         # 0 if none, else shape + 1, rotation, x, y, color, pieces placed
+NEXT = 4          # shape, color
+HOLD = 8          # 0 if none, else shape + 1, color
+SCORE = 16        # score, lines, level
+GARBAGE = 32      # pending garbage lines
+GAME_OVER = 64
+
+PALETTE = Board.COLORS + (Board.GRAY,)    # colors are sent as indices into this, plus one
+COLOR_INDEX = {color: i + 1 for i, color in enumerate(PALETTE)}
+SHAPE_INDEX = {shape: i for i, shape in enumerate(Factory.SHAPES)}
+
+MAX_BACKLOG = 64 * 1024    # bytes waiting to be sent, beyond which a client is skipped for a tick
+
+
+def message(kind, body = b""):
+	payload = bytes([kind]) + body
+	return encodeVarint(len(payload)) + payload
+
+async def readMessage(reader):
+	# returns (type, payload) of the next message, or (None, b"") once the connection closes
+	try:
+		length = 0
+		shift = 0
+		while True:
+			byte = (await reader.readexactly(1))[0]
+			length |= (byte & 0x7f) << shift
+			shift += 7
+			if not byte & 0x80:
+				break
+		payload = await reader.readexactly(length)
+	except (asyncio.IncompleteReadError, ConnectionError):
+		return None, b""
+	if not payload:       # every message has a type, a peer sending less is broken
+		return None, b""
+	return payload[0], payload[1:]
+
+
+class BoardView:
+	# what one client was last sent about one board
+
+	def __init__(self, height):
+		self.rows = [None] * height
+		self.version = -1
+		self.piece = self.next = self.hold = self.score = self.garbage = None
+		self.gameOver = False
+
+	def delta(self, engine):
+		# encodes what changed in the engine's game since the last delta, and remembers it
+		board = engine.board
+		flags = 0
+		body = b""
+
+		if board.version != self.version:
+			changed = [y for y in range(board.BOARD_HEIGHT) if self.rows[y] != board.board[y]]
+			if changed:
+				flags |= ROWS
+				body += encodeVarint(len(changed))
+				for y in changed:
+					row = board.board[y]
+					body += encodeVarint(y) + encodeVarint(board.rows[y])
+					body += bytes(COLOR_INDEX[color] for color in row if color != board.EMPTY)
+					self.rows[y] = list(row)
+			self.version = board.version
+
+		piece = engine.currentPiece
+		state = (SHAPE_INDEX[piece.shape] + 1, piece.rotation, piece.x, piece.y,
+			COLOR_INDEX[piece.color], engine.piecesPlaced) if piece is not None else (0,)
+		if state != self.piece:
+			flags |= PIECE
+			self.piece = state
+			if len(state) == 1:
+				body += encodeVarint(0)
+			else:
+				shape, rotation, x, y, color, placed = state
+				body += b"".join(encodeVarint(value) for value in (shape, rotation, zigzag(x), zigzag(y), color, placed))
+
+		for flag, attribute, piece in ((NEXT, "next", engine.nextPiece), (HOLD, "hold", engine.holdPiece)):
+			state = (SHAPE_INDEX[piece.shape] + 1, COLOR_INDEX[piece.color]) if piece is not None else (0, 0)
+			if state != getattr(self, attribute):
+				flags |= flag
+				setattr(self, attribute, state)
+				body += encodeVarint(state[0]) + encodeVarint(state[1])
+
+		score = (engine.score, engine.lines, engine.level)
+		if score != self.score:
+			flags |= SCORE
+			self.score = score
+			body += b"".join(encodeVarint(value) for value in score)
+
+		garbage = sum(lines for lines, hole in engine.pendingGarbage)
+		if garbage != self.garbage:
+			flags |= GARBAGE
+			self.garbage = garbage
+			body += encodeVarint(garbage)
+
+		if engine.gameOver and not self.gameOver:
+			flags |= GAME_OVER
+			self.gameOver = True
+
+		return encodeVarint(flags) + body
+
+
+class RemoteGame:
+	# a client's copy of one player's game, kept up to date from board deltas
+
+	def __init__(self, width, height):
+		self.board = Board(width, height, 0)
+		self.currentPiece = None
+		self.nextPiece = None
+		self.holdPiece = None
+		self.piecesPlaced = 0
+		self.score = self.lines = self.level = 0
+		self.pendingGarbage = 0
+		self.gameOver = False
+
+	def apply(self, data, offset):
+		# applies the delta starting at data[offset], returns the offset after it
+		def varint():
+			nonlocal offset
+			value, offset = decodeVarint(data, offset)
+			return value
+
+		board = self.board
+		flags = varint()
+
+		if flags & ROWS:
+			for i in range(varint()):
+				y, mask = varint(), varint()
+				row = [board.EMPTY] * board.BOARD_WIDTH
+				for x in range(board.BOARD_WIDTH):
+					if mask >> x & 1:
+						row[x] = PALETTE[data[offset] - 1]
+						offset += 1
+				board.board[y] = row
+				board.shared[y] = 0
+				board.hash ^= zobrist.rowHash(board.keys, y, board.rows[y] ^ mask)
+				board.rows[y] = mask
+			board.updateTops()
+			board.version += 1
+
+		if flags & PIECE:
+			shape = varint()
+			if shape == 0:
+				self.currentPiece = None
+			else:
+				rotation, x, y, color = varint(), unzigzag(varint()), unzigzag(varint()), varint()
+				self.currentPiece = Pentomino(Factory.SHAPES[shape - 1], PALETTE[color - 1], x, y)
+				self.currentPiece.rotation = rotation
+				self.piecesPlaced = varint()
+
+		for flag, attribute in ((NEXT, "nextPiece"), (HOLD, "holdPiece")):
+			if flags & flag:
+				shape, color = varint(), varint()
+				setattr(self, attribute, Pentomino(Factory.SHAPES[shape - 1], PALETTE[color - 1], 0)
+					if shape else None)
+
+		if flags & SCORE:
+			self.score, self.lines, self.level = varint(), varint(), varint()
+		if flags & GARBAGE:
+			self.pendingGarbage = varint()
+		if flags & GAME_OVER:
+			self.gameOver = True
+
+		return offset
+
+
+class Player:
+
+	def __init__(self, name, reader, writer):
+		self.name = name
+		self.reader = reader
+		self.writer = writer
+		self.inputs = []          # (PRESS or RELEASE, action) received since the last tick
+		self.match = None
+		self.index = 0
+		self.engine = None
+		self.controller = None
+		self.views = None         # BoardView of player 0 and player 1, as this player last saw them
+		self.garbageSent = 0      # of engine.garbageSent, how much was delivered already
+		self.game = None          # id of the game in the spectator stream, if any
+		self.connected = True
+
+	def send(self, data):
+		if self.connected and not self.writer.is_closing():
+			self.writer.write(data)
+
+	def backlog(self):
+		return self.writer.transport.get_write_buffer_size()
+
+
+class Match:
+
+	def __init__(self, players, seed, width, height):
+		self.players = players
+		self.seed = seed
+		self.random = random.Random(seed)    # garbage hole columns
+		self.tick = 0
+		self.over = False
+
+		for index, player in enumerate(players):
+			player.match = self
+			player.index = index
+			player.engine = Engine(width, height, seed = seed)    # both players get the same pieces
+			player.controller = Controller(player.engine)
+			player.views = [BoardView(height) for p in players]
+			opponent = players[1 - index]
+			player.send(message(START, encodeVarint(index) + encodeVarint(seed) + encodeVarint(width)
+				+ encodeVarint(height) + encodeString(opponent.name)))
+
+	def step(self):
+		# one tick of both games, then the garbage they sent is delivered. Returns True once the match is over.
+		self.tick += 1
+		for player in self.players:
+			for kind, action in player.inputs:
+				if kind == PRESS:
+					player.controller.press(action)
+				else:
+					player.controller.release(action)
+			player.inputs.clear()
+			if not player.connected:
+				player.engine.gameOver = True
+			player.controller.tick()
+
+		for player in self.players:
+			sent = player.engine.garbageSent - player.garbageSent
+			if sent:
+				player.garbageSent = player.engine.garbageSent
+				opponent = self.players[1 - player.index]
+				opponent.engine.addGarbage(sent, self.random.randrange(opponent.engine.board.BOARD_WIDTH))
+
+		self.over = any(player.engine.gameOver for player in self.players)
+		return self.over
+
+	def broadcast(self):
+		# sends every client the delta of both boards; returns the bytes sent
+		sent = 0
+		tick = encodeVarint(self.tick)
+		for player in self.players:
+			if not player.connected or player.backlog() > MAX_BACKLOG:
+				continue     # deltas accumulate in the views until the client catches up
+			body = tick + b"".join(view.delta(other.engine) for view, other in zip(player.views, self.players))
+			data = message(STATE, body)
+			player.send(data)
+			sent += len(data)
+		return sent
+
+	def finish(self):
+		# the player who is still standing wins, if both topped out on the same tick it is a draw
+		alive = [player.index for player in self.players if not player.engine.gameOver]
+		winner = alive[0] if len(alive) == 1 else 2
+		for player in self.players:
+			player.send(message(END, encodeVarint(winner)))
+			if not player.writer.is_closing():
+				player.writer.close()
+		return winner
+
+
+class MatchServer:
+
+	def __init__(self, host = "127.0.0.1", port = 0, tick_rate = Engine.TICKS_PER_SECOND,
+				board_width = 14, board_height = 24, seed = None, spectators = None):
+		# spectators is an optional SpectatorHub (see spectator.py) every game is streamed to
+		self.host = host
+		self.port = port
+		self.tickTime = 1.0 / tick_rate
+		self.width = board_width
+		self.height = board_height
+		self.random = random.Random(seed)     # seeds of the matches
+		self.spectators = spectators
+
+		self.lobby = []           # players waiting for an opponent
+		self.matches = []
+		self.connections = set()  # tasks handling a client
+		self.server = None
+		self.ticker = None
+
+		self.ticks = 0
+		self.lateTicks = 0        # ticks that started more than a tick late
+		self.tickTimes = RingBuffer(1024)   # seconds spent on each tick
+		self.lags = RingBuffer(1024)        # seconds each tick started after it was due
+		self.bytesSent = 0
+		self.finished = 0
+		self.failed = 0          # matches ended by an error
+
+	async def start(self):
+		self.server = await asyncio.start_server(self.handle, self.host, self.port)
+		self.port = self.server.sockets[0].getsockname()[1]
+		self.ticker = asyncio.ensure_future(self.run())
+		return self
+
+	async def close(self):
+		self.ticker.cancel()
+		self.server.close()
+		for player in self.lobby + [player for match in self.matches for player in match.players]:
+			player.writer.close()
+		# with their connections closed, the handlers see the end of their streams and return
+		await asyncio.gather(*self.connections, return_exceptions = True)
+		await self.server.wait_closed()
+
+	async def handle(self, reader, writer):
+		task = asyncio.current_task()
+		self.connections.add(task)
+		try:
+			await self.serve(reader, writer)
+		except (EOFError, ValueError, IndexError):
+			pass    # a malformed message, the connection is dropped
+		finally:
+			self.connections.discard(task)
+			writer.close()
+
+	async def serve(self, reader, writer):
+		kind, body = await readMessage(reader)
+		if kind != JOIN:
+			return
+
+		length, offset = decodeVarint(body, 0)
+		if offset + length > len(body):
+			raise EOFError("truncated player name")
+		player = Player(body[offset:offset + length].decode("utf-8", "replace"), reader, writer)
+		self.lobby.append(player)
+		if len(self.lobby) >= 2:
+			players, self.lobby = self.lobby[:2], self.lobby[2:]
+			self.matches.append(Match(players, self.random.randrange(1 << 31), self.width, self.height))
+			if self.spectators is not None:
+				for joined in players:
+					joined.game = self.spectators.addGame(joined.engine)
+
+		try:
+			while True:
+				kind, body = await readMessage(reader)
+				if kind is None:
+					break
+				if kind not in (PRESS, RELEASE) or len(body) != 1 or body[0] not in CLIENT_ACTIONS:
+					break     # not something a client sends, drop the connection
+				player.inputs.append((kind, body[0]))
+		finally:
+			player.connected = False
+			if player in self.lobby:
+				self.lobby.remove(player)
+
+	async def run(self):
+		# ticks every match at a fixed rate; when the server falls behind by more
+		# than a few ticks it resynchronizes instead of running a burst of ticks
+		loop = asyncio.get_running_loop()
+		due = loop.time()
+
+		while True:
+			now = loop.time()
+			lag = now - due
+			self.lags.add(max(lag, 0.0))
+			if lag > self.tickTime:
+				self.lateTicks += 1
+			if lag > 4 * self.tickTime:
+				due = now
+
+			start = time.perf_counter()
+			self.tick()
+			self.tickTimes.add(time.perf_counter() - start)
+
+			due += self.tickTime
+			await asyncio.sleep(max(0.0, due - loop.time()))
+
+	def tick(self):
+		self.ticks += 1
+		running = []
+		for match in self.matches:
+			try:
+				over = match.step()
+				self.bytesSent += match.broadcast()
+			except Exception:
+				# a match that fails ends (as a draw unless someone had already lost)
+				# rather than stopping every other match on the server
+				self.failed += 1
+				over = match.over = True
+			if over:
+				match.finish()
+				self.finished += 1
+				if self.spectators is not None:
+					for player in match.players:
+						self.spectators.removeGame(player.game)
+			else:
+				running.append(match)
+		self.matches = running
+
+		if self.spectators is not None:
+			self.spectators.publish()
+
+	def stats(self):
+		tick50, tick99 = self.tickTimes.percentiles(50, 99)
+		lag50, lag99 = self.lags.percentiles(50, 99)
+		return {"ticks": self.ticks, "late_ticks": self.lateTicks, "matches": len(self.matches),
+			"finished": self.finished, "failed": self.failed,
+			"tick_ms_p50": 1000 * tick50, "tick_ms_p99": 1000 * tick99,
+			"lag_ms_p50": 1000 * lag50, "lag_ms_p99": 1000 * lag99, "bytes_sent": self.bytesSent}
+
+
+class MatchClient:
+
+	def __init__(self, name = "player"):
+		self.name = name
+		self.reader = None
+		self.writer = None
+		self.index = None         # which of the two games is ours
+		self.games = None         # RemoteGame of player 0 and player 1
+		self.opponent = None
+		self.seed = None
+		self.tick = 0
+		self.winner = None
+
+	async def connect(self, host, port):
+		# joins the server and waits until a match starts
+		self.reader, self.writer = await asyncio.open_connection(host, port)
+		self.writer.write(message(JOIN, encodeString(self.name)))
+
+		kind, body = await readMessage(self.reader)
+		if kind != START:
+			raise ConnectionError("server closed the connection before the match started")
+
+		offset = 0
+		values = []
+		for i in range(4):
+			value, offset = decodeVarint(body, offset)
+			values.append(value)
+		self.index, self.seed, width, height = values
+		length, offset = decodeVarint(body, offset)
+		self.opponent = body[offset:offset + length].decode("utf-8", "replace")
+		self.games = [RemoteGame(width, height), RemoteGame(width, height)]
+
+	@property
+	def game(self):
+		return self.games[self.index]
+
+	def press(self, action):
+		self.writer.write(message(PRESS, bytes([action])))
+
+	def release(self, action):
+		self.writer.write(message(RELEASE, bytes([action])))
+
+	async def receive(self):
+		# handles the next message from the server and returns its type, None once disconnected
+		kind, body = await readMessage(self.reader)
+		if kind == STATE:
+			self.tick, offset = decodeVarint(body, 0)
+			for game in self.games:
+				offset = game.apply(body, offset)
+		elif kind == END:
+			self.winner = decodeVarint(body, 0)[0]
+		return kind
+
+	def close(self):
+		if self.writer is not None:
+			self.writer.close()
+
+
+async def playBot(host, port, name = "bot", delay = 0.2, games = None):
+	# A computer player: `delay` seconds after every new piece appears, it sends the
+	# moves that take the piece to the reachable placement leaving the best board.
+	# Plays `games` matches in a row (forever if None) and returns the results.
+	ai = AI()
+	results = []
+
+	while games is None or len(results) < games:
+		client = MatchClient(name)
+		try:
+			await client.connect(host, port)
+		except (ConnectionError, OSError):
+			break
+
+		planned = None
+		pending = None
+		loop = asyncio.get_running_loop()
+
+		while True:
+			kind = await client.receive()
+			if kind is None or kind == END:
+				break
+
+			game = client.game
+			piece = game.currentPiece
+			if game.gameOver or piece is None:
+				continue
+
+			if game.piecesPlaced != planned:
+				planned = game.piecesPlaced
+				pending = loop.time() + delay
+			elif pending is not None and loop.time() >= pending:
+				# planned from where the piece is now, it may have fallen in the meantime
+				for action in bestPath(ai, game.board, piece):
+					client.press(action)
+					client.release(action)
+				pending = None
+
+		results.append(client.winner == client.index)
+		client.close()
+
+	return results
+
+def bestPath(ai, board, piece):
+	# the actions taking the piece to the reachable placement with the best board, then a hard drop
+	best = None
+	for placement in board.reachablePlacements(piece):
+		rows, cleared = place(board.rows, piece.shape[placement.rotation], placement.x, placement.y, board.FULL_ROW)
+		value = ai.LINES_WEIGHT * cleared + ai.evaluate(rows, board.BOARD_WIDTH)
+		if best is None or value > best[0]:
+			best = (value, placement)
+
+	if best is None:
+		return [actions.HARD_DROP]
+	return list(best[1].path) + [actions.HARD_DROP]
+
+
+def runBots(host, port, count, delay):
+	# plays count bots against the server until the process is stopped
+	async def bots():
+		await asyncio.gather(*[playBot(host, port, "bot%d" % i, delay) for i in range(count)])
+	asyncio.run(bots())
+
+async def loadTest(matches, seconds, tick_rate, delay):
+	# Runs a server with `matches` bot matches for some seconds and returns its stats.
+	# The bots think in a process of their own, so only the server's work is measured.
+	server = await MatchServer(tick_rate = tick_rate, seed = 0).start()
+	bots = multiprocessing.Process(target = runBots, args = (server.host, server.port, 2 * matches, delay),
+		daemon = True)
+	bots.start()
+
+	await asyncio.sleep(seconds)
+	stats = server.stats()
+
+	bots.terminate()
+	bots.join()
+	await server.close()
+	return stats
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = "Pentris multiplayer over the local network.")
+	commands = parser.add_subparsers(dest = "command", required = True)
+
+	serve = commands.add_parser("server", help = "run a match server")
+	serve.add_argument("--host", default = "0.0.0.0")
+	serve.add_argument("--port", type = int, default = 7777)
+	serve.add_argument("--tick-rate", type = int, default = Engine.TICKS_PER_SECOND)
+	serve.add_argument("--spectator-port", type = int, help = "also stream every game to spectators on this port")
+
+	bot = commands.add_parser("bot", help = "connect a computer player")
+	bot.add_argument("--host", default = "127.0.0.1")
+	bot.add_argument("--port", type = int, default = 7777)
+	bot.add_argument("--name", default = "bot")
+	bot.add_argument("--delay", type = float, default = 0.2, help = "seconds the bot waits before each move")
+	bot.add_argument("--games", type = int, default = 1)
+
+	load = commands.add_parser("loadtest", help = "run a server and pairs of bots on localhost, report tick timing")
+	load.add_argument("--matches", type = int, default = 24)
+	load.add_argument("--seconds", type = float, default = 10)
+	load.add_argument("--tick-rate", type = int, default = Engine.TICKS_PER_SECOND)
+	load.add_argument("--delay", type = float, default = 0.05, help = "seconds the bots wait before each move")
+
+	args = parser.parse_args(argv)
+
+	if args.command == "server":
+		async def serveForever():
+			hub = None
+			if args.spectator_port is not None:
+				from spectator import SpectatorHub, SpectatorServer
+				hub = SpectatorHub()
+				await SpectatorServer(hub, args.host, args.spectator_port).start()
+			server = await MatchServer(args.host, args.port, args.tick_rate, spectators = hub).start()
+			print("serving on port %d" % server.port)
+			await server.ticker
+		asyncio.run(serveForever())
+
+	elif args.command == "bot":
+		results = asyncio.run(playBot(args.host, args.port, args.name, args.delay, args.games))
+		print("won %d of %d" % (sum(results), len(results)))
+
+	else:
+		stats = asyncio.run(loadTest(args.matches, args.seconds, args.tick_rate, args.delay))
+		for key, value in stats.items():
+			print("%-12s %s" % (key, round(value, 3) if isinstance(value, float) else value))
+
+
+if __name__ == '__main__':
+	main()
@@ -1,14 +1,18 @@
 """ Generic pentomino class representing a shape with five minos. The input
-shape should come from factory.py and is a list of all of the possible
-rotations of the particular shape.
+shape should come from factory.py and is a compiled Shape (see shape.py)
+holding all of the possible rotations of the particular shape.
 
 Only ONE pentomino should be active in play on the board at any one time. Once
 the pentomino has been settled on the board, it should be added to the board permanently.
 """
 class Pentomino:
 
+	# pieces are created for every spawn and probed constantly, so keep them compact;
+	# the shape data itself is shared, never copied
+	__slots__ = ("shape", "color", "rotation", "x", "y", "ghost")
+
 	def __init__(self, shape, color, start_x, start_y = -1):
-		# shape is the matrix of all possible templates of the shape
+		# shape is the compiled Shape holding all possible templates, shared between pieces
 		# start_x and start_y are the coordinates relative to the BOARD!
 		# by default, start_y starts above the actual board
 		self.shape = shape
@@ -16,6 +20,7 @@ class Pentomino:
 		self.rotation = 0
 		self.x = start_x
 		self.y = start_y
+		self.ghost = None     # cached hard drop position, see Board.ghostY
 
 	def getCurrentTemplate(self):
 		return self.shape[self.rotation]
@@ -40,4 +45,23 @@ class Pentomino:
 		self.y += 1
 
 	def moveUp(self):
-		self.y -= 1
\ No newline at end of file
+		self.y -= 1
+
+
+class Placement:
+	# A final resting spot for a pentomino: rotation and board coordinates.
+	# If y is None the piece is dropped straight down from where it currently is.
+	# path is an optional sequence of actions (see actions.py) that reaches it.
+	# hold means the current piece is swapped with the hold slot before placing.
+
+	__slots__ = ("x", "rotation", "y", "path", "hold")
+
+	def __init__(self, x, rotation, y = None, path = (), hold = False):
+		self.x = x
+		self.rotation = rotation
+		self.y = y
+		self.path = path
+		self.hold = hold
+
+	def __repr__(self):
+		return "Placement(x=%r, rotation=%r, y=%r, hold=%r)" % (self.x, self.rotation, self.y, self.hold)
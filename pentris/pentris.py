@@ -5,17 +5,29 @@ Allen Cheng | allen12@umd.edu | computer_allen@yahoo.com
 https://github.com/allen12/pentris
 """
 
-from copy import deepcopy
-import random, time, pygame, sys
+import time
+START_TIME = time.perf_counter()   # startup is measured from here to the first frame
+
+import pygame, sys
 from pygame.locals import *
 
-from board import Board
-from factory import Factory
-from pentomino import Pentomino
+import actions
+from ai import AI
+from audio import AudioManager
+from controls import Controller
+from engine import Engine
+from gamestate import UndoStack
+from hud import Hud
+from profiler import Profiler
+from renderer import Renderer
+from sprites import spritesFor
 
 
 FPS = 60  # because every game should run at 60 fps!
 
+TICK_TIME = 1.0 / Engine.TICKS_PER_SECOND   # seconds of game time per logic tick
+MAX_FRAME_TIME = 0.25    # longest stall that is caught up on, so a hiccup doesn't snowball
+
 WINDOW_WIDTH = 900      # can be adjusted 
 WINDOW_HEIGHT = 675     # 4:3 aspect ratio preferred
 
@@ -29,9 +41,6 @@ BOARD_HEIGHT = MINO_SIZE * BOARD_MINO_HEIGHT   # Pixel height of board
 LEFT_RIGHT_MARGIN = (WINDOW_WIDTH - BOARD_WIDTH)//2
 TOP_MARGIN = WINDOW_HEIGHT - BOARD_HEIGHT - 10
 
-MOVE_SIDEWAYS_TIME = 0.12      # delay to keep moving a pentomino sideways
-SOFT_DROP_TIME = 0.06          # delay to keep soft dropping a pentomino
-
 # COLOR DEFINITIONS
 #          ( R ,  G ,  B )
 BLUE     = (  0,   0, 255)
@@ -48,292 +57,320 @@ TEAL     = (  0, 128, 128)
 WHITE    = (255, 255, 255)
 YELLOW   = (255, 255,   0)
 
-COLORS = (AQUA, BLUE, FUSCHIA, GREEN, LIME, NAVY_BLU, PURPLE,
-			RED, SILVER, TEAL, WHITE, YELLOW)
-
 TEXTCOLOR = WHITE
 
-def main():
-	global FPS_CLOCK, SPRITEBATCH, BASICFONT
+# screen regions of the status panels, redrawn separately from the board
+STATS_RECT = pygame.Rect(WINDOW_WIDTH - 250, 30, 250, 110)
+NEXT_RECT = pygame.Rect(0, WINDOW_HEIGHT - 120, LEFT_RIGHT_MARGIN - 10, 120)
+HOLD_RECT = pygame.Rect(0, 60, LEFT_RIGHT_MARGIN - 10, 200)
+PROFILE_RECT = pygame.Rect(0, 280, LEFT_RIGHT_MARGIN - 10, 260)
+
+RENDERER = None   # dirty-region renderer of the board, created on the first draw
+
+AUTOPLAY_BUDGET_MS = 12   # time the computer player may think about each piece
+
+AUTOPLAY = False          # set from the command line in main()
+TURBO = False
+RECORD_PATH = None
+PRACTICE = False
+LARGE_BOARD = None        # (columns, rows) of a large board, see main()
+ORDER = 5                 # minos per piece
+
+UNDO_LIMIT = 100          # pieces that can be taken back in practice mode
+
+PROFILER = Profiler()      # times the phases of every frame while enabled
+PROFILE_HUD = None         # small-font Hud of the overlay, created when first shown
+PROFILE_OVERLAY = False    # toggled with F3
+PROFILE_PATH = None        # file the profile is dumped to, if any
+PROFILE_DUMP_INTERVAL = 5  # seconds between dumps
+
+# keys that map straight onto engine actions
+KEY_ACTIONS = {
+	K_LEFT: actions.LEFT,
+	K_RIGHT: actions.RIGHT,
+	K_DOWN: actions.SOFT_DROP,
+	K_SPACE: actions.HARD_DROP,
+	K_UP: actions.ROTATE_CW,
+	K_z: actions.ROTATE_CCW,
+	K_LSHIFT: actions.HOLD,
+	K_RSHIFT: actions.HOLD,
+}
+
+# takes back the last piece in practice mode
+UNDO_KEY = K_BACKSPACE
 
-	pygame.init()
+def main():
+	global FPS_CLOCK, SPRITEBATCH, BASICFONT, HUD, AUDIO, AUTOPLAY, TURBO, RECORD_PATH, PROFILE_PATH, PRACTICE, LARGE_BOARD, ORDER
+
+	# "python pentris.py --autoplay" lets the computer play; the A key toggles it in game
+	AUTOPLAY = "--autoplay" in sys.argv[1:]
+
+	# "python pentris.py --turbo" runs the game logic as fast as it goes; the T key toggles it
+	TURBO = "--turbo" in sys.argv[1:]
+
+	# "python pentris.py --record FILE" saves a replay of the game (see replay.py)
+	RECORD_PATH = None
+	if "--record" in sys.argv[1:-1]:
+		RECORD_PATH = sys.argv[sys.argv.index("--record") + 1]
+
+	# "python pentris.py --practice" lets Backspace take back pieces, unless recording
+	PRACTICE = "--practice" in sys.argv[1:]
+
+	# "python pentris.py --board 40x3000" plays on a large board, stored sparsely
+	# and scrolled to follow the falling piece
+	LARGE_BOARD = None
+	if "--board" in sys.argv[1:-1]:
+		columns, rows = sys.argv[sys.argv.index("--board") + 1].lower().split("x")
+		LARGE_BOARD = (int(columns), int(rows))
+
+	# "python pentris.py --order 6" plays with hexominoes (4 for tetrominoes...)
+	ORDER = 5
+	if "--order" in sys.argv[1:-1]:
+		ORDER = int(sys.argv[sys.argv.index("--order") + 1])
+
+	# "python pentris.py --profile FILE" dumps frame timings to FILE (.csv or .json)
+	# every few seconds; F3 shows them in game
+	PROFILE_PATH = None
+	if "--profile" in sys.argv[1:-1]:
+		PROFILE_PATH = sys.argv[sys.argv.index("--profile") + 1]
+		PROFILER.enabled = True
+
+	# only what the first frame needs is initialized here, the mixer is started
+	# by the audio loader thread
+	pygame.display.init()
+	pygame.font.init()
 	FPS_CLOCK = pygame.time.Clock()
 	BASICFONT = pygame.font.Font(None, 36)
+	HUD = Hud(BASICFONT, TEXTCOLOR, BLACK)
+	HUD.profiler = PROFILER
 	SPRITEBATCH = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+	spritesFor(MINO_SIZE)     # pre-render the mino sprites before the first frame
 
-	# start playing the background music
-	pygame.mixer.music.load('tetris_m_cut.mp3')   # start playing the tetris music
-	pygame.mixer.music.set_volume(0.5)
-	pygame.mixer.music.play(-1, 0.0)        # loop indefinitely
+	# decode the sound effects and start the tetris music in the background
+	AUDIO = AudioManager({'harddrop': 'harddrop.ogg', 'hold': 'hold.wav'})
+	AUDIO.start(music = 'tetris_m_cut.mp3', volume = 0.5)
 
 	play()
 
-	pygame.mixer.music.stop()
+	AUDIO.stopMusic()
 
 	quit()
 
 def play():
 
-	global lastFallTime, lastPlayerDownTime, lastPlayerSidewaysTime, score
-
-	board = Board(BOARD_MINO_WIDTH, BOARD_MINO_HEIGHT, MINO_SIZE)
-	factory = Factory()
-
-	lastFallTime = time.time()             # last time the piece fell downwards by itself
-	lastPlayerDownTime =  time.time()      # last time the player soft drops
-	lastPlayerSidewaysTime = time.time()   # last time the player moves a piece sideways
-
-	PENTOMINO_START_X = BOARD_MINO_WIDTH // 2 - 3   # coordinates of starting location
-	PENTOMINO_START_Y = -1
-
-	# initialize the starting pentomino pieces
-	currentPiece = Pentomino(factory.obtainShape(), getRandomColor(), PENTOMINO_START_X)
-	nextPiece = Pentomino(factory.obtainShape(), getRandomColor(), PENTOMINO_START_X)
-	holdPiece = None
-
-	usedHold = False    # Set to true if player uses "Hold" on the current piece
-
-	# keep track of whether piece is currently moving or not through the game loop
-	goingDown = goingLeft = goingRight = False
-
-	level = 0
-	score = 0
-	lines = 0
-
-	fallTime = 1.00 - level*0.08         # how many seconds pass for piece to auto-fall one space
+	if LARGE_BOARD is None:
+		engine = Engine(BOARD_MINO_WIDTH, BOARD_MINO_HEIGHT, MINO_SIZE, order = ORDER)
+	else:
+		# minos shrink until the board is no wider than the usual one
+		columns, rows = LARGE_BOARD
+		engine = Engine(columns, rows, max(min(MINO_SIZE, BOARD_WIDTH // columns), 4), sparse = True,
+			order = ORDER)
+	player = AI(budget_ms = AUTOPLAY_BUDGET_MS)
+	engine.profiler = PROFILER
+
+	recorder = None
+	if RECORD_PATH:
+		from replay import ReplayWriter   # pulls in the process pool machinery, only load it when recording
+		recorder = ReplayWriter(RECORD_PATH, engine)
+
+	# a replay can't be rewound, so there is no undo while recording
+	undo = None
+	if PRACTICE and recorder is None:
+		undo = UndoStack(UNDO_LIMIT)
+
+	try:
+		gameLoop(engine, player, recorder, undo)
+	finally:
+		if recorder is not None:
+			recorder.close()
+		if PROFILE_PATH is not None:
+			PROFILER.dump(PROFILE_PATH)
+
+def gameLoop(engine, player, recorder, undo = None):
+	# Fixed-timestep loop: the time that passed since the last frame is added to
+	# an accumulator and spent in whole logic ticks, then the frame is drawn with
+	# the falling piece blended between its last two tick positions. In turbo
+	# mode ticks run back to back for a whole frame instead.
+
+	controller = Controller(engine)
+	saved = engine.snapshot() if undo is not None else None   # the game as the current piece spawned
+	accumulator = 0.0
+	previousTime = time.perf_counter()
+	nextDump = previousTime + PROFILE_DUMP_INTERVAL
 
 	while True: # infinite game loop
 
-		# if (currentPiece != None):
-		# 	print("currentPiece: " + str(currentPiece.x) + " " + str(currentPiece.y))
+		now = time.perf_counter()
+		PROFILER.record('frame', now - previousTime)
+		PROFILER.start()
+		accumulator += min(now - previousTime, MAX_FRAME_TIME)
+		previousTime = now
 
 		checkQuit()
 
-		# check if there is currently a pentomino in play. if not, generate a new one
-		if currentPiece == None: 
-			currentPiece = nextPiece
-			nextPiece = Pentomino(factory.obtainShape(), getRandomColor(), PENTOMINO_START_X)
-
-			# new piece can't fit on the board, game over!
-			if not board.isPentominoValid(currentPiece):
-				return
-
-		# if piece is currently detected as moving sideways or soft dropping, do that
-		handlePentominoMovement(board, currentPiece, goingDown, goingLeft, goingRight)
+		# new piece can't fit on the board, game over!
+		if engine.gameOver:
+			return
 
 		# handle user input events
-		for event in pygame.event.get(KEYUP):
-			if event.key == K_LEFT:
-				goingLeft = False
-			elif event.key == K_RIGHT:
-				goingRight = False
-			elif event.key == K_DOWN:
-				goingDown = False
-
-		for event in pygame.event.get(KEYDOWN):
-			# sideways movements
-			if event.key == K_LEFT:
-				currentPiece.moveLeft()
-				if not board.isPentominoValid(currentPiece):
-					currentPiece.moveRight()
-				else:
-					goingLeft = True
-					lastPlayerSidewaysTime = time.time()
-			elif event.key == K_RIGHT:
-				currentPiece.moveRight()
-				if not board.isPentominoValid(currentPiece):
-					currentPiece.moveLeft()
-				else:
-					lastPlayerSidewaysTime = time.time()
-					goingRight = True
-
-			# soft drop movements
-			elif event.key == K_DOWN:
-				currentPiece.moveDown()
-				if not board.isPentominoValid(currentPiece):
-					currentPiece.moveUp()
-				else:
-					lastPlayerDownTime = time.time()
-					goingDown = True
-					score += 1
-
-			# hard drop movements
-			elif event.key == K_SPACE:
-
-				hold = pygame.mixer.Sound("harddrop.ogg") 
-				hold.play()
-
-				while board.isPentominoValid(currentPiece):
-					currentPiece.moveDown()
-					score += 2
-
-				score -= 2
-				currentPiece.moveUp()
-
-			# rotations
-			elif event.key == K_UP:
-				currentPiece.rotateClockwise()
-				if not board.isPentominoValid(currentPiece):
-					currentPiece.rotateCounterclockwise()
-
-			elif event.key == K_z:
-				currentPiece.rotateCounterclockwise()
-				if not board.isPentominoValid(currentPiece):
-					currentPiece.rotateClockwise()
-
-			# hold
-			elif event.key == K_LSHIFT or event.key == K_RSHIFT:
-				if usedHold:    # not allowed to hold more than once per falling piece
-					continue
-
-				hold = pygame.mixer.Sound("hold.wav")   # play "hold" sound effect
-				hold.play()
-
-				usedHold = True
-				# reset piece orientation
-				currentPiece.x = PENTOMINO_START_X
-				currentPiece.y = PENTOMINO_START_Y
-				currentPiece.rotation = 0
-
-				tempPiece = holdPiece    # swap hold and currentPiece
-				holdPiece = currentPiece
-				currentPiece = tempPiece
-
-				if currentPiece == None:
-					currentPiece = nextPiece
-					nextPiece = Pentomino(factory.obtainShape(), getRandomColor(), PENTOMINO_START_X)
-
-				# reset piece orientation
-				currentPiece.x = PENTOMINO_START_X
-				currentPiece.y = PENTOMINO_START_Y
-				currentPiece.rotation = 0
-
-		# if current piece has landed on the board, then clear any complete lines
-		if handlePentominoFall(board, currentPiece, fallTime):
-			global MOVE_SIDEWAYS_TIME, SOFT_DROP_TIME
-
-			board.addPentominoToBoard(currentPiece)     # permanently add to board
-			usedHold = False
-			currentPiece = None
-
-			lines_cleared = board.checkForCompleteLines()    # obtain how many lines cleared
-			lines += lines_cleared
-
-			if lines_cleared == 1:                 # adjust score as necessary
-				score += 1000 * (level+1)
-			elif lines_cleared == 2:
-				score += 3500 * (level+1)
-			elif lines_cleared == 3:
-				score += 7000 * (level+1)
-			elif lines_cleared == 4:
-				score += 15000 * (level+1)
-			elif lines_cleared == 5:
-				score += 35000 * (level+1)
-
-			# calculate increases in level and difficulty, if necessary
-			level = lines // 5
-			fallTime = 1.00 - level * 0.08
-			MOVE_SIDEWAYS_TIME = 0.12 - level * 0.01
-			SOFT_DROP_TIME = 0.06 - level * 0.01
-			if fallTime < 0.03:
-				fallTime = 0.03
+		handleInput(controller, undo)
+		PROFILER.mark('input')
+
+		if TURBO:
+			deadline = now + 1.0 / FPS
+			while not engine.gameOver and time.perf_counter() < deadline:
+				runTick(engine, controller, player)
+			accumulator = 0.0
+			alpha = 1.0
+		else:
+			while accumulator >= TICK_TIME and not engine.gameOver:
+				runTick(engine, controller, player)
+				accumulator -= TICK_TIME
+			alpha = accumulator / TICK_TIME
+		PROFILER.mark('logic')    # includes the 'ai' and 'lines' samples
+
+		# in practice mode every locked piece can be taken back
+		if undo is not None and engine.piecesPlaced != saved.piecesPlaced:
+			if engine.piecesPlaced > saved.piecesPlaced:
+				undo.push(saved)
+			saved = engine.snapshot()
 
 		# draw everything, including the board and status updates
-		draw(board, currentPiece, nextPiece, holdPiece, level, score, lines)
+		draw(engine.board, engine.currentPiece, engine.nextPiece, engine.holdPiece,
+			engine.level, engine.score, engine.lines, controller.interpolate(alpha))
+		if 'startup ms' not in PROFILER.values:
+			PROFILER.setValue('startup ms', round(1000 * (time.perf_counter() - START_TIME)))
 		pygame.event.pump()   # needed if no user input events in a while, otherwise game freezes
-		FPS_CLOCK.tick(FPS)
-
-def handlePentominoMovement(board, pentomino, goingDown, goingLeft, goingRight):
-	global lastPlayerDownTime, lastPlayerSidewaysTime, score
-
-	# only allow moving sideways if it has been MOVE_SIDEWAYS_TIME seconds since last movement
-	if time.time() - lastPlayerSidewaysTime > MOVE_SIDEWAYS_TIME:
-		if goingLeft:
-			pentomino.moveLeft()
-			if not board.isPentominoValid(pentomino):
-				pentomino.moveRight()
-			else:
-				lastPlayerSidewaysTime = time.time()
-		if goingRight:
-			pentomino.moveRight()
-			if not board.isPentominoValid(pentomino):
-				pentomino.moveLeft()
-			else:
-				lastPlayerSidewaysTime = time.time()
-
-	# similar action with soft dropping / moving downwards
-	if time.time() - lastPlayerDownTime > SOFT_DROP_TIME:
-		if goingDown:
-			pentomino.moveDown()
-			if not board.isPentominoValid(pentomino):
-				pentomino.moveUp()
-			else:
-				lastPlayerDownTime = time.time()
-				score += 1
-
-
-def handlePentominoFall(board, pentomino, fallTime):
-	# Handles the natural fall of the pentomino without user action.
-	# Returns True if the pentomino has landed as far as possible and is ready
-	# to be permanently added to the board
-	global lastFallTime
-
-	if time.time() - lastFallTime > fallTime:
-		pentomino_copy = deepcopy(pentomino)
-		pentomino_copy.moveDown()
-
-		if board.isPentominoValid(pentomino_copy):
-			pentomino.moveDown()
-			lastFallTime = time.time()
-			return False
-		else:
-			return True
 
-def draw(board, pentomino, next_pentomino, hold_petrimino, level, score, lines):
-	global SPRITEBATCH, BASICFONT
+		if PROFILE_PATH is not None and now >= nextDump:
+			PROFILER.dump(PROFILE_PATH)
+			nextDump = now + PROFILE_DUMP_INTERVAL
 
-	SPRITEBATCH.fill(BLACK)
-	board.drawBoard(SPRITEBATCH, LEFT_RIGHT_MARGIN, TOP_MARGIN)
+		if not TURBO:
+			FPS_CLOCK.tick(FPS)
 
-    # draw the score text
-	scoreSurf = BASICFONT.render('Score: %s' % score, True, TEXTCOLOR)
-	scoreRect = scoreSurf.get_rect()
-	scoreRect.topleft = (WINDOW_WIDTH - 250, 30)
-	SPRITEBATCH.blit(scoreSurf, scoreRect)
-
-    # draw the level text
-	levelSurf = BASICFONT.render('Level: %s' % level, True, TEXTCOLOR)
-	levelRect = levelSurf.get_rect()
-	levelRect.topleft = (WINDOW_WIDTH - 250, 70)
-	SPRITEBATCH.blit(levelSurf, levelRect)
-
-    # draw the lines text
-	levelSurf = BASICFONT.render('Lines: %s' % lines, True, TEXTCOLOR)
-	levelRect = levelSurf.get_rect()
-	levelRect.topleft = (WINDOW_WIDTH - 250, 110)
-	SPRITEBATCH.blit(levelSurf, levelRect)
+def handleInput(controller, undo = None):
+	global AUTOPLAY, TURBO, PROFILE_OVERLAY
 
+	for event in pygame.event.get(KEYUP):
+		if event.key in KEY_ACTIONS:
+			controller.release(KEY_ACTIONS[event.key])
+
+	for event in pygame.event.get(KEYDOWN):
+		if event.key in KEY_ACTIONS:
+			action = KEY_ACTIONS[event.key]
+			if action == actions.HARD_DROP:
+				AUDIO.play('harddrop')
+
+			# not allowed to hold more than once per falling piece
+			if controller.press(action) and action == actions.HOLD:
+				AUDIO.play('hold')   # play "hold" sound effect
+
+		# computer player
+		elif event.key == K_a:
+			AUTOPLAY = not AUTOPLAY
+
+		# run the game as fast as possible
+		elif event.key == K_t:
+			TURBO = not TURBO
+
+		# back to where the last piece spawned
+		elif event.key == UNDO_KEY and undo is not None:
+			state = undo.pop()
+			if state is not None:
+				controller.engine.restore(state)
+
+		# frame time overlay, profiling runs while it is shown
+		elif event.key == K_F3:
+			PROFILE_OVERLAY = not PROFILE_OVERLAY
+			PROFILER.enabled = PROFILE_OVERLAY or PROFILE_PATH is not None
+
+def runTick(engine, controller, player):
+	# the computer player places one piece per tick
+	if AUTOPLAY:
+		placement = PROFILER.call('ai', player.choose, engine)
+		if placement is None:
+			engine.step(actions.HARD_DROP)
+		else:
+			engine.hardDropTo(placement)
+
+	controller.tick()
+
+def draw(board, pentomino, next_pentomino, hold_petrimino, level, score, lines, offset = (0.0, 0.0)):
+	global RENDERER
+
+	# start from a clean window whenever a new board is shown; boards taller than
+	# the usual one are seen through a viewport of its height
+	if RENDERER is None or RENDERER.board is not board:
+		left = LEFT_RIGHT_MARGIN + (BOARD_WIDTH - board.BOARD_WIDTH * board.MINO_SIZE) // 2
+		RENDERER = Renderer(board, left, TOP_MARGIN, BOARD_HEIGHT // board.MINO_SIZE)
+		HUD.invalidate()
+
+	# only the parts of the board that changed are redrawn
+	dirty = RENDERER.draw(SPRITEBATCH, pentomino, offset)
+
+	# the status panels are redrawn only when what they show changes
+	dirty += HUD.panel(SPRITEBATCH, 'stats', STATS_RECT, (score, level, lines), drawStats, score, level, lines)
+	dirty += HUD.panel(SPRITEBATCH, 'next', NEXT_RECT, pieceKey(next_pentomino), drawNext, board, next_pentomino)
+	dirty += HUD.panel(SPRITEBATCH, 'hold', HOLD_RECT, pieceKey(hold_petrimino), drawHold, board, hold_petrimino)
+
+	# the overlay is refreshed twice a second, and cleared once when hidden
+	if PROFILE_OVERLAY:
+		dirty += HUD.panel(SPRITEBATCH, 'profile', PROFILE_RECT, int(time.perf_counter() * 2), drawProfile)
+	else:
+		dirty += HUD.panel(SPRITEBATCH, 'profile', PROFILE_RECT, None, drawNothing)
+	PROFILER.mark('draw')
+
+	if dirty:
+		pygame.display.update(dirty)
+	PROFILER.mark('update')
+
+def pieceKey(pentomino):
+	# what a preview panel needs to know to decide whether the piece looks different
+	if pentomino is None:
+		return None
+	return (pentomino, pentomino.getCurrentTemplate(), pentomino.color)
+
+def drawStats(score, level, lines):
+	# draw the score, level and lines text
+	HUD.drawValue(SPRITEBATCH, 'Score: ', score, (WINDOW_WIDTH - 250, 30))
+	HUD.drawValue(SPRITEBATCH, 'Level: ', level, (WINDOW_WIDTH - 250, 70))
+	HUD.drawValue(SPRITEBATCH, 'Lines: ', lines, (WINDOW_WIDTH - 250, 110))
+
+def drawNext(board, next_pentomino):
 	# draw the "next" piece
-	nextSurf = BASICFONT.render('Next:', True, TEXTCOLOR)
-	nextRect = nextSurf.get_rect()
-	nextRect.topleft = (120, WINDOW_HEIGHT - 120)
-	SPRITEBATCH.blit(nextSurf, nextRect)
-	board.drawPentominoPixels(SPRITEBATCH, next_pentomino, 120 - MINO_SIZE, WINDOW_HEIGHT - 80)
+	HUD.drawText(SPRITEBATCH, 'Next:', (120, WINDOW_HEIGHT - 120))
+	drawPreview(board, next_pentomino, 120, WINDOW_HEIGHT - 80)
 
+def drawHold(board, hold_petrimino):
 	# draw the "hold" piece
-	holdSurf = BASICFONT.render('Hold:', True, TEXTCOLOR)
-	holdRect = holdSurf.get_rect()
-	holdRect.topleft = (120, 60)
-	SPRITEBATCH.blit(holdSurf, holdRect)
+	HUD.drawText(SPRITEBATCH, 'Hold:', (120, 60))
 
 	if hold_petrimino != None:
-		board.drawPentominoPixels(SPRITEBATCH, hold_petrimino, 120 - MINO_SIZE, 100)
-	
-	if pentomino != None:
-		board.drawGhostPentomino(SPRITEBATCH, pentomino, LEFT_RIGHT_MARGIN, TOP_MARGIN)
-		board.drawPentomino(SPRITEBATCH, pentomino, LEFT_RIGHT_MARGIN, TOP_MARGIN)
+		drawPreview(board, hold_petrimino, 120, 100)
+
+def drawPreview(board, pentomino, pixel_x, pixel_y):
+	# draws the piece with its leftmost and topmost minos at pixel_x, pixel_y,
+	# whatever empty rows and columns surround it in its template
+	template = pentomino.getCurrentTemplate()
+	board.drawPentominoPixels(SPRITEBATCH, pentomino, pixel_x - template.left * board.MINO_SIZE,
+		pixel_y - template.top * board.MINO_SIZE)
+
+def drawProfile():
+	global PROFILE_HUD
 
-	pygame.display.update()
+	if PROFILE_HUD is None:
+		PROFILE_HUD = Hud(pygame.font.SysFont('monospace', 13), TEXTCOLOR, BLACK, cache_size = 32)
+
+	audio = AUDIO.stats()
+	lines = PROFILER.lines() + ['audio    late %d dropped %d' % (audio['late'], audio['dropped'])]
+	if audio['load_time'] is not None:
+		lines.append('audio load ms %d' % (1000 * audio['load_time']))
+	for i, line in enumerate(lines):
+		PROFILE_HUD.drawText(SPRITEBATCH, line, (PROFILE_RECT.x + 10, PROFILE_RECT.y + i * 16))
+
+def drawNothing():
+	pass
 
 def checkQuit():
 	if pygame.event.peek(QUIT):
@@ -349,9 +386,6 @@ def quit():
 	pygame.quit()
 	sys.exit()
 
-def getRandomColor():
-	return random.choice(COLORS)
-
 
 if __name__ == '__main__':
 	main()
\ No newline at end of file
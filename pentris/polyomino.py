@@ -0,0 +1,246 @@
+""" Generated polyomino shapes. Instead of typing every rotation of every piece
+in by hand, the pieces of a given size n (4 for tetrominoes, 5 for pentominoes,
+6 for hexominoes...) are enumerated:
+
+	free polyominoes     grown one cell at a time from the monomino, each kept
+	                     once under rotation and reflection
+	one-sided pieces     the free ones, plus the mirror image of every one that
+	                     isn't its own mirror image (F and F', L and J...)
+	rotation states      the distinct rotations of a piece (1, 2 or 4), turned
+	                     about the center of its bounding box and placed in one
+	                     frame, so a piece rotates in place
+
+Pieces with a well-known name (see NAMES) get it, and spawn in the orientation
+drawn there; the others are numbered in a fixed order.
+
+Enumeration grows quickly with n, so the generated tables are stored in a
+versioned JSON cache (one file per n, under CACHE_DIR) and loaded from there
+on later runs. The tables of the BUNDLED orders ship next to this module
+instead, so the default game neither generates nor writes anything. Bump
+CACHE_VERSION whenever the generated tables change, and rewrite the shipped
+ones with --bundle.
+
+	python polyomino.py 4 5 6 7     # generate (or load) and list the pieces
+	python polyomino.py --bundle    # rewrite the shipped tables
+"""
+
+import argparse, json, os, tempfile, time
+
+from shape import Shape, FILLED
+
+CACHE_VERSION = 1
+CACHE_DIR = os.environ.get("PENTRIS_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "pentris")
+
+BUNDLED = (5,)     # orders whose tables ship with the game, in BUNDLED_DIR
+BUNDLED_DIR = os.path.dirname(os.path.abspath(__file__))
+
+EMPTY = "."
+
+# Named pieces, in the order the Factory deals them from, each drawn in its
+# spawn orientation with rows separated by "/". A primed name is the mirror image.
+NAMES = {
+	4: [("I", "OOOO"), ("O", "OO/OO"), ("T", ".O./OOO"), ("S", ".OO/OO."), ("Z", "OO./.OO"),
+		("J", "O../OOO"), ("L", "..O/OOO")],
+	5: [("F", ".OO/OO./.O."), ("F'", "OO./.OO/.O."), ("I", "OOOOO"), ("L", "...O/OOOO"),
+		("J", "O.../OOOO"), ("N", "OOO./..OO"), ("N'", ".OOO/OO.."), ("P", "OO/OO/O."),
+		("Q", "OO/OO/.O"), ("T", ".O./.O./OOO"), ("U", "O.O/OOO"), ("V", "O../O../OOO"),
+		("W", "O../OO./.OO"), ("X", ".O./OOO/.O."), ("Y", "..O./OOOO"), ("Y'", ".O../OOOO"),
+		("Z", "OO./.O./.OO"), ("S", ".OO/.O./OO.")],
+}
+
+_shapes = {}     # n -> the compiled Shapes, once loaded
+
+
+def normalize(cells):
+	# the cells moved so the smallest x and y are 0, sorted
+	left = min(x for x, y in cells)
+	top = min(y for x, y in cells)
+	return tuple(sorted((x - left, y - top) for x, y in cells))
+
+def rotate(cells):
+	# a quarter turn clockwise (y points down)
+	return [(-y, x) for x, y in cells]
+
+def mirror(cells):
+	return [(-x, y) for x, y in cells]
+
+def rotations(cells):
+	# the four rotations of cells, normalized
+	result = []
+	for i in range(4):
+		result.append(normalize(cells))
+		cells = rotate(cells)
+	return result
+
+def oneSidedKey(cells):
+	# the same for every rotation of a piece, different for its mirror image unless symmetric
+	return min(rotations(cells))
+
+def freeKey(cells):
+	# the same for every rotation and reflection of a piece
+	return min(oneSidedKey(cells), oneSidedKey(mirror(cells)))
+
+def freePolyominoes(n):
+	# The canonical form (see freeKey) of every free n-omino, sorted. Grows every
+	# polyomino of each size by one cell in every possible place.
+	shapes = {((0, 0),)}
+	for size in range(2, n + 1):
+		grown = set()
+		for cells in shapes:
+			occupied = set(cells)
+			for x, y in cells:
+				for cell in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+					if cell not in occupied:
+						grown.add(freeKey(cells + (cell,)))
+		shapes = grown
+	return sorted(shapes)
+
+def oneSided(n):
+	# (name, cells in spawn orientation) of every one-sided n-omino, named ones in NAMES order
+	pieces = []
+	for number, cells in enumerate(freePolyominoes(n)):
+		spawn = spawnOrientation(cells)
+		name = "%d-%02d" % (n, number + 1)
+		pieces.append((name, spawn))
+		if oneSidedKey(mirror(cells)) != oneSidedKey(cells):
+			pieces.append((name + "'", normalize(mirror(spawn))))
+
+	if n not in NAMES:
+		return pieces
+
+	# named sets replace the numbered names and orientations, and must cover every piece
+	named = [(name, parse(picture)) for name, picture in NAMES[n]]
+	if sorted(oneSidedKey(cells) for name, cells in named) != sorted(oneSidedKey(cells) for name, cells in pieces):
+		raise ValueError("NAMES[%d] doesn't match the generated pieces!" % n)
+	return named
+
+def spawnOrientation(cells):
+	# the rotation a numbered piece spawns in: the first, in sorted order, at least as wide as tall
+	def width(cells):
+		return max(x for x, y in cells) + 1
+
+	def height(cells):
+		return max(y for x, y in cells) + 1
+
+	return min(rotations(cells), key = lambda cells: (width(cells) < height(cells), cells))
+
+def parse(picture):
+	return normalize([(x, y) for y, row in enumerate(picture.split("/"))
+		for x, char in enumerate(row) if char == FILLED])
+
+def rotationTemplates(cells):
+	# The distinct rotation states of a piece as ASCII templates (see shape.py),
+	# turned about the center of the spawn orientation's bounding box and drawn
+	# in one shared frame. Centers can fall between cells, so the coordinates
+	# are doubled while turning and rounded down afterwards.
+	cells = normalize(cells)
+	center_x = max(x for x, y in cells)       # doubled center of the bounding box
+	center_y = max(y for x, y in cells)
+
+	states = []
+	doubled = [(2 * x - center_x, 2 * y - center_y) for x, y in cells]
+	for i in range(4):
+		state = [((x + center_x) // 2, (y + center_y) // 2) for x, y in doubled]
+		if i and normalize(state) == normalize(states[0]):
+			break     # symmetric, the remaining rotations repeat the first ones
+		states.append(state)
+		doubled = rotate(doubled)
+
+	left = min(x for state in states for x, y in state)
+	top = min(y for state in states for x, y in state)
+	width = max(x for state in states for x, y in state) - left + 1
+	height = max(y for state in states for x, y in state) - top + 1
+
+	templates = []
+	for state in states:
+		grid = [[EMPTY] * width for y in range(height)]
+		for x, y in state:
+			grid[y - top][x - left] = FILLED
+		templates.append(["".join(row) for row in grid])
+	return templates
+
+def generate(n):
+	# [name, templates] of every one-sided n-omino
+	return [[name, rotationTemplates(cells)] for name, cells in oneSided(n)]
+
+def cachePath(n, cache_dir = None):
+	return os.path.join(cache_dir or CACHE_DIR, "polyominoes-%d.json" % n)
+
+def tablePath(n):
+	# where load(n) looks for the table of n
+	return cachePath(n, BUNDLED_DIR) if n in BUNDLED else cachePath(n)
+
+def readTable(path, n):
+	# the table stored at path, None if it is missing, unreadable or of another version
+	try:
+		with open(path) as stream:
+			stored = json.load(stream)
+		if stored["version"] == CACHE_VERSION and stored["order"] == n:
+			return stored["shapes"]
+	except (OSError, ValueError, KeyError, TypeError):
+		pass
+	return None
+
+def writeTable(path, n, table):
+	os.makedirs(os.path.dirname(path), exist_ok = True)
+	# written to a temporary file first, so a concurrent start never reads half a table
+	handle, temporary = tempfile.mkstemp(dir = os.path.dirname(path), suffix = ".tmp")
+	with os.fdopen(handle, "w") as stream:
+		json.dump({"version": CACHE_VERSION, "order": n, "shapes": table}, stream)
+	os.replace(temporary, path)
+
+def load(n, cache_dir = None):
+	# generate(n), from the shipped table of a BUNDLED order, otherwise from the
+	# cache, which is filled in when it doesn't hold a table of the current version
+	if n in BUNDLED:
+		table = readTable(cachePath(n, BUNDLED_DIR), n)
+		return table if table is not None else generate(n)    # out of date, see --bundle
+
+	path = cachePath(n, cache_dir)
+	table = readTable(path, n)
+	if table is not None:
+		return table
+
+	table = generate(n)
+	try:
+		writeTable(path, n, table)
+	except OSError:
+		pass    # a read-only cache only costs the time to generate
+	return table
+
+def shapes(n = 5):
+	# the compiled Shapes of every one-sided n-omino, shared by everything using them
+	if n not in _shapes:
+		_shapes[n] = [Shape(name, templates) for name, templates in load(n)]
+	return _shapes[n]
+
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = "Generate and cache the polyomino shapes.")
+	parser.add_argument("sizes", nargs = "*", type = int, default = [5], help = "minos per piece")
+	parser.add_argument("--rebuild", action = "store_true", help = "ignore the cache and generate again")
+	parser.add_argument("--bundle", action = "store_true", help = "rewrite the tables shipped with the game")
+	args = parser.parse_args(argv)
+
+	if args.bundle:
+		for n in BUNDLED:
+			writeTable(cachePath(n, BUNDLED_DIR), n, generate(n))
+			print("wrote %s" % cachePath(n, BUNDLED_DIR))
+		return
+
+	for n in args.sizes:
+		start = time.perf_counter()
+		if args.rebuild and n not in BUNDLED and os.path.exists(cachePath(n)):
+			os.remove(cachePath(n))
+		table = load(n)
+		elapsed = time.perf_counter() - start
+
+		# mirror images have the same free key, so the one-sided pieces give the free count
+		free = {freeKey(parse("/".join(templates[0]))) for name, templates in table}
+		print("%d: %d free, %d one-sided, %.1f ms (%s)" % (n, len(free), len(table), 1000 * elapsed,
+			tablePath(n)))
+		print("   " + " ".join(name for name, templates in table))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,132 @@
+""" Frame-time profiler. The game loop marks the end of each of its phases
+(input, game logic, drawing, display update...) and the Profiler keeps the
+most recent durations of every phase in a fixed-size ring buffer, from which
+rolling percentiles are computed on demand. Hot paths deeper down, such as
+line clearing in the Engine or font rendering in the Hud, are timed through
+the optional profiler attribute of those objects with call().
+
+While disabled, mark() and call() return right away, so the hooks can stay
+in the loop for good. Summaries can be dumped to CSV (one row per phase per
+dump, appended) or JSON (the latest summary, overwritten).
+"""
+
+import csv, json, os, time
+from array import array
+
+
+class RingBuffer:
+	# the last `size` samples added, overwriting the oldest ones
+
+	def __init__(self, size):
+		self.samples = array('d', bytes(8 * size))
+		self.index = 0
+		self.count = 0
+		self.total = 0      # samples ever added
+
+	def add(self, value):
+		self.samples[self.index] = value
+		self.index = (self.index + 1) % len(self.samples)
+		self.count = min(self.count + 1, len(self.samples))
+		self.total += 1
+
+	def values(self):
+		return self.samples[:self.count] if self.count < len(self.samples) else self.samples[:]
+
+	def percentiles(self, *qs):
+		# nearest-rank percentiles (0-100) of the samples held, 0 when empty
+		ordered = sorted(self.values())
+		if not ordered:
+			return [0.0 for q in qs]
+		return [ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))] for q in qs]
+
+
+class Profiler:
+
+	PERCENTILES = (50, 95, 99)
+
+	def __init__(self, size = 600, enabled = False):
+		# size is how many samples per phase the percentiles are computed over
+		self.size = size
+		self.enabled = enabled
+		self.phases = {}        # phase name -> RingBuffer of durations in seconds, in first-seen order
+		self.last = 0.0         # time of the latest mark
+		self.values = {}        # name -> one-off measurement, such as startup time
+
+	def buffer(self, phase):
+		buffer = self.phases.get(phase)
+		if buffer is None:
+			buffer = self.phases[phase] = RingBuffer(self.size)
+		return buffer
+
+	def start(self):
+		# starts timing a new frame; the first mark() measures from here
+		if self.enabled:
+			self.last = time.perf_counter()
+
+	def mark(self, phase):
+		# records the time since the previous mark (or start) as a sample of phase
+		if not self.enabled:
+			return
+		now = time.perf_counter()
+		self.buffer(phase).add(now - self.last)
+		self.last = now
+
+	def record(self, phase, seconds):
+		if self.enabled:
+			self.buffer(phase).add(seconds)
+
+	def call(self, phase, function, *args):
+		# calls function(*args), recording how long it took as a sample of phase
+		if not self.enabled:
+			return function(*args)
+		start = time.perf_counter()
+		result = function(*args)
+		self.buffer(phase).add(time.perf_counter() - start)
+		return result
+
+	def setValue(self, name, value):
+		# a single number, such as the startup time, reported along with the phases
+		self.values[name] = value
+
+	def summary(self):
+		# phase -> {count, mean, p50, p95, p99, max}, durations in milliseconds
+		summary = {}
+		for phase, buffer in self.phases.items():
+			samples = buffer.values()
+			if not samples:
+				continue
+			entry = {"count": buffer.total, "mean": 1000 * sum(samples) / len(samples)}
+			for q, value in zip(self.PERCENTILES, buffer.percentiles(*self.PERCENTILES)):
+				entry["p%d" % q] = 1000 * value
+			entry["max"] = 1000 * max(samples)
+			summary[phase] = entry
+		return summary
+
+	def lines(self):
+		# the summary as text, one line per phase, for the overlay
+		text = ["%-8s %6s %6s %6s" % ("ms", "p50", "p95", "p99")]
+		for phase, entry in self.summary().items():
+			text.append("%-8s %6.2f %6.2f %6.2f" % (phase[:8], entry["p50"], entry["p95"], entry["p99"]))
+		for name, value in self.values.items():
+			text.append("%s %s" % (name, value))
+		return text
+
+	def dump(self, path):
+		# appends the summary to a .csv file, or writes it to any other file as JSON
+		summary = self.summary()
+		stamp = time.time()
+
+		if path.endswith(".csv"):
+			new = not os.path.exists(path) or os.path.getsize(path) == 0
+			with open(path, "a", newline = "") as stream:
+				writer = csv.writer(stream)
+				if new:
+					writer.writerow(["time", "phase", "count", "mean", "p50", "p95", "p99", "max"])
+				for phase, entry in summary.items():
+					writer.writerow(["%.3f" % stamp, phase, entry["count"]]
+						+ ["%.4f" % entry[key] for key in ("mean", "p50", "p95", "p99", "max")])
+				for name, value in self.values.items():     # one-off measurements fill every column
+					writer.writerow(["%.3f" % stamp, name, 1] + [value] * 5)
+		else:
+			with open(path, "w") as stream:
+				json.dump({"time": stamp, "phases": summary, "values": self.values}, stream, indent = 1)
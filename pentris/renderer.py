@@ -0,0 +1,168 @@
+""" Dirty-region renderer for the playing field. Instead of clearing and redrawing
+the whole window every frame, the Renderer keeps a cached background surface
+holding the border and the locked minos of the board, redraws only the board
+rows that changed since the last frame, and restores and redraws only the
+rectangles covered by the falling piece and its ghost when they move.
+
+draw() returns the list of screen rectangles that changed, to be handed to
+pygame.display.update() together with any other dirty regions of the frame.
+The falling piece can be drawn a fraction of a cell away from its position,
+which the fixed-timestep loop uses to smooth its movement between ticks.
+
+Boards taller than the screen are shown through a viewport of visible_rows
+rows, which scrolls to keep the falling piece in view. Only the rows in the
+viewport are ever compared or drawn, however tall the board is.
+"""
+
+import pygame
+
+from board import Board
+
+
+class Renderer:
+
+	def __init__(self, board, board_x, board_y, visible_rows = None):
+		# board_x and board_y are the pixel locations of the top-left corner of the board
+		# visible_rows is the height of the viewport, the whole board by default
+		self.board = board
+		self.BOARD_X = board_x
+		self.BOARD_Y = board_y
+		self.visibleRows = min(visible_rows or board.BOARD_HEIGHT, board.BOARD_HEIGHT)
+		self.viewTop = 0           # the board row at the top of the viewport
+
+		self.background = None     # window-sized copy of everything but the falling piece
+		self.rows = None           # the rows of the viewport as they are drawn on the background
+		self.version = None        # board.version when the rows were last compared
+		self.pieceState = None     # what the falling piece looked like when last drawn
+		self.pieceRects = []       # screen rectangles it covered
+
+	def invalidate(self):
+		# forces a full redraw on the next frame
+		self.background = None
+
+	def draw(self, spritebatch, pentomino, offset = (0.0, 0.0)):
+		# Brings the board, ghost and falling pentomino on spritebatch up to date and
+		# returns the changed rectangles. offset is how far, in cells, the piece (but
+		# not its ghost) is drawn from where it is. After invalidate() (and on the
+		# first frame) the whole window is redrawn and returned.
+		board = self.board
+		size = board.MINO_SIZE
+		offset = (round(offset[0] * size), round(offset[1] * size))
+		scrolled = self.scrollTo(pentomino)
+
+		if self.background is None or self.background.get_size() != spritebatch.get_size():
+			self.background = pygame.Surface(spritebatch.get_size())
+			self.background.fill(Board.BLACK)
+			board.drawBoard(self.background, self.BOARD_X, self.BOARD_Y, self.viewTop, self.visibleRows)
+			self.rows = self.viewRows()
+			self.version = board.version
+
+			spritebatch.blit(self.background, (0, 0))
+			self.pieceState = None
+			self.pieceRects = self.drawPiece(spritebatch, pentomino, offset)
+			self.pieceState = self.stateOf(pentomino, offset)
+			return [spritebatch.get_rect()]
+
+		dirty = []
+
+		if scrolled:
+			# every row of the viewport moved, draw them all again
+			board.drawRows(self.background, self.BOARD_X, self.BOARD_Y, self.viewTop, self.visibleRows)
+			self.rows = self.viewRows()
+			self.version = board.version
+			dirty.append(self.cellsRect(0, self.viewTop, board.BOARD_WIDTH, self.visibleRows))
+
+		# redraw the rows of locked minos that changed on the cached background
+		if board.version != self.version:
+			for i, row in enumerate(self.viewRows()):
+				if row != self.rows[i]:
+					y = self.viewTop + i
+					rect = self.rowRect(y)
+					self.background.fill(Board.BLACK, rect)
+					board.drawRow(self.background, y, self.BOARD_X, self.BOARD_Y - self.viewTop * size)
+					self.rows[i] = row
+					dirty.append(rect)
+			self.version = board.version
+
+		state = self.stateOf(pentomino, offset)
+		if state != self.pieceState:
+			dirty.extend(self.pieceRects)     # where the piece used to be
+			self.pieceRects = self.rectsOf(pentomino, state)
+			dirty.extend(self.pieceRects)
+			self.pieceState = state
+
+		if not dirty:
+			return dirty
+
+		# restore the background under every dirty rectangle, then put the piece back on top
+		for rect in dirty:
+			spritebatch.blit(self.background, rect, rect)
+		self.drawPiece(spritebatch, pentomino, offset)
+
+		return dirty
+
+	def viewRows(self):
+		# the rows in the viewport, as tuples so they can be kept and compared
+		board = self.board.board
+		return [tuple(board[y]) for y in range(self.viewTop, self.viewTop + self.visibleRows)]
+
+	def scrollTo(self, pentomino):
+		# Moves the viewport, if needed, so the falling piece is in view, along with
+		# its ghost when both fit. Returns True if it moved.
+		if pentomino is None or self.visibleRows == self.board.BOARD_HEIGHT:
+			return False
+
+		template = pentomino.getCurrentTemplate()
+		first = pentomino.y + template.top
+		last = self.board.ghostY(pentomino) + template.bottom
+		if last - first >= self.visibleRows:
+			last = pentomino.y + template.bottom
+
+		view_top = self.viewTop
+		if first < view_top:
+			view_top = first - self.visibleRows // 4      # leave room above, pieces come from there
+		elif last >= view_top + self.visibleRows:
+			view_top = last - self.visibleRows + 1 + self.visibleRows // 4
+		view_top = max(0, min(view_top, self.board.BOARD_HEIGHT - self.visibleRows))
+
+		if view_top == self.viewTop:
+			return False
+		self.viewTop = view_top
+		return True
+
+	def stateOf(self, pentomino, offset = (0, 0)):
+		if pentomino is None:
+			return None
+		return (pentomino.x, pentomino.y, pentomino.getCurrentTemplate(), pentomino.color,
+			self.board.ghostY(pentomino), offset)
+
+	def rectsOf(self, pentomino, state):
+		# screen rectangles covering the piece and its ghost
+		if state is None:
+			return []
+
+		x, y, template, color, ghost_y, offset = state
+		return [self.cellsRect(x + template.left, y + template.top, template.width, template.height).move(offset),
+			self.cellsRect(x + template.left, ghost_y + template.top, template.width, template.height)]
+
+	def drawPiece(self, spritebatch, pentomino, offset = (0, 0)):
+		if pentomino is None:
+			return []
+
+		# ghost and piece go out in a single batch, the piece on top, cut off below the viewport
+		board_y = self.BOARD_Y - self.viewTop * self.board.MINO_SIZE
+		clip = spritebatch.get_clip()
+		spritebatch.set_clip(clip.clip(0, 0, clip.right, self.cellsRect(0, self.viewTop + self.visibleRows, 0, 0).top))
+		spritebatch.blits(self.board.ghostBlits(pentomino, self.BOARD_X, board_y)
+			+ self.board.pentominoBlits(pentomino, self.BOARD_X + offset[0], board_y + offset[1]), False)
+		spritebatch.set_clip(clip)
+		return self.rectsOf(pentomino, self.stateOf(pentomino, offset))
+
+	def rowRect(self, y):
+		return self.cellsRect(0, y, self.board.BOARD_WIDTH, 1)
+
+	def cellsRect(self, x, y, width, height):
+		# screen rectangle of a block of cells, given in board coordinates
+		size = self.board.MINO_SIZE
+		return pygame.Rect(self.BOARD_X + x * size, self.BOARD_Y + (y - self.viewTop) * size,
+			width * size, height * size)
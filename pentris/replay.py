@@ -0,0 +1,198 @@
+""" Recording and playback of games. Since an Engine is fully determined by its
+seed and the actions applied to it, a replay is just the game settings plus
+the stream of actions, each tagged with the logic tick it happened on:
+
+	magic "PNTR", format version
+	header: seed, board width, board height, randomizer name, preview size,
+		minos per piece
+	events: varint (ticks since previous event << 4 | opcode)
+		opcodes 0-7 are the actions of actions.py (only those that had an effect),
+		PLACE is Engine.hardDropTo followed by x, rotation, y and hold
+	END event, followed by the final score, lines, level, pieces placed,
+		game over flag and the occupancy mask of every board row
+
+All numbers are varints (see codec.py), so a typical event takes one or two
+bytes. Events are written as the game runs; the footer is added by close().
+
+Replays are re-simulated as fast as the CPU allows, ignoring tick timing:
+
+	python replay.py verify recordings/*.pentris
+"""
+
+import argparse, sys
+from concurrent.futures import ProcessPoolExecutor
+
+from codec import encodeVarint, readVarint, zigzag, unzigzag, encodeString
+from engine import Engine
+from pentomino import Placement
+
+MAGIC = b"PNTR"
+VERSION = 2      # 1 was before the pieces were generated (see polyomino.py)
+
+PLACE = 8
+END = 15
+
+
+class ReplayWriter:
+
+	def __init__(self, path, engine):
+		# starts a replay of the engine, which must not have been played yet,
+		# and attaches itself to it so every action is recorded from now on
+		self.file = open(path, "wb")
+		self.engine = engine
+		self.frame = 0         # the current logic tick, set by the Controller (see controls.py)
+		self.lastFrame = 0
+
+		header = MAGIC + bytes([VERSION])
+		header += encodeVarint(engine.seed)
+		header += encodeVarint(engine.board.BOARD_WIDTH) + encodeVarint(engine.board.BOARD_HEIGHT)
+		header += encodeString(engine.factory.randomizerName)
+		header += encodeVarint(len(engine.factory.upcoming))
+		header += encodeVarint(engine.factory.order)
+		self.file.write(header)
+
+		engine.recorder = self
+
+	def event(self, opcode):
+		delta = self.frame - self.lastFrame
+		self.lastFrame = self.frame
+		self.file.write(encodeVarint((delta << 4) | opcode))
+
+	def recordAction(self, action):
+		self.event(action)
+
+	def recordPlacement(self, placement):
+		self.event(PLACE)
+		y = 0 if placement.y is None else zigzag(placement.y) + 1
+		self.file.write(encodeVarint(zigzag(placement.x)) + encodeVarint(placement.rotation)
+			+ encodeVarint(y) + encodeVarint(int(placement.hold)))
+
+	def close(self):
+		# writes the final state of the game and closes the file
+		if self.file.closed:
+			return
+
+		engine = self.engine
+		self.event(END)
+		footer = b"".join(encodeVarint(value) for value in (engine.score, engine.lines,
+			engine.level, engine.piecesPlaced, int(engine.gameOver)))
+		footer += b"".join(encodeVarint(row) for row in engine.board.rows)
+		self.file.write(footer)
+		self.file.close()
+		engine.recorder = None
+
+
+class ReplayError(Exception):
+	pass
+
+
+def readReplay(path):
+	# Returns (settings, events, final) of a replay file. events is a list of
+	# (frame, opcode, placement or None); final is the recorded end state, or
+	# None if the replay was never closed.
+	with open(path, "rb") as stream:
+		if stream.read(len(MAGIC)) != MAGIC:
+			raise ReplayError("%s is not a pentris replay" % path)
+		version = stream.read(1)
+		if not version or version[0] != VERSION:
+			raise ReplayError("%s has an unsupported replay version" % path)
+
+		def read():
+			# the next varint, None at the end of the file
+			try:
+				return readVarint(stream)
+			except EOFError:     # the file ends in the middle of one
+				raise ReplayError("%s is truncated" % path)
+
+		def varint():
+			value = read()
+			if value is None:
+				raise ReplayError("%s is truncated" % path)
+			return value
+
+		seed, width, height = varint(), varint(), varint()
+		randomizer = stream.read(varint()).decode("utf-8")
+		settings = {"seed": seed, "board_width": width, "board_height": height,
+			"randomizer": randomizer, "preview": varint(), "order": varint()}
+
+		events = []
+		frame = 0
+		while True:
+			value = read()
+			if value is None:     # the game didn't finish writing
+				return settings, events, None
+
+			frame += value >> 4
+			opcode = value & 0xf
+
+			if opcode == END:
+				break
+			elif opcode == PLACE:
+				x, rotation, y, hold = unzigzag(varint()), varint(), varint(), varint()
+				placement = Placement(x, rotation, None if y == 0 else unzigzag(y - 1), hold = bool(hold))
+				events.append((frame, opcode, placement))
+			else:
+				events.append((frame, opcode, None))
+
+		final = {"score": varint(), "lines": varint(), "level": varint(), "pieces": varint(),
+			"game_over": bool(varint()), "rows": [varint() for y in range(height)]}
+		return settings, events, final
+
+def simulate(settings, events):
+	# re-plays the events on a fresh engine and returns it
+	engine = Engine(settings["board_width"], settings["board_height"], seed = settings["seed"],
+		randomizer = settings["randomizer"], preview = settings["preview"], order = settings["order"])
+
+	for frame, opcode, placement in events:
+		if opcode == PLACE:
+			try:
+				engine.hardDropTo(placement)
+			except ValueError:     # rejected during the game too
+				pass
+		else:
+			engine.step(opcode)
+
+	return engine
+
+def verify(path):
+	# re-simulates a replay and returns a list of differences from the recorded end state
+	settings, events, final = readReplay(path)
+	if final is None:
+		return ["replay was not closed, no final state to compare against"]
+
+	engine = simulate(settings, events)
+	actual = {"score": engine.score, "lines": engine.lines, "level": engine.level,
+		"pieces": engine.piecesPlaced, "game_over": engine.gameOver, "rows": engine.board.rows}
+
+	return ["%s: recorded %r, simulated %r" % (key, final[key], actual[key])
+		for key in final if final[key] != actual[key]]
+
+def verifyFile(path):
+	try:
+		return path, verify(path)
+	except (ReplayError, OSError) as error:
+		return path, [str(error)]
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = "Work with recorded pentris games.")
+	commands = parser.add_subparsers(dest = "command", required = True)
+	check = commands.add_parser("verify", help = "re-simulate replays and check their final state")
+	check.add_argument("paths", nargs = "+")
+	check.add_argument("--workers", type = int, default = None, help = "worker processes (default: all cores)")
+	args = parser.parse_args(argv)
+
+	failures = 0
+	with ProcessPoolExecutor(max_workers = args.workers) as pool:
+		for path, problems in pool.map(verifyFile, args.paths, chunksize = 16):
+			if problems:
+				failures += 1
+				print("MISMATCH %s" % path)
+				for problem in problems:
+					print("    " + problem)
+
+	print("%d replays verified, %d mismatched" % (len(args.paths), failures))
+	return 1 if failures else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
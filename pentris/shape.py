@@ -0,0 +1,83 @@
+""" Compiled pentomino shapes. The ASCII templates in factory.py are parsed once,
+at import time, into Template objects holding everything the board, renderer
+and AI need: the occupied cells, the bounding box, per-row bitmasks and the
+lowest filled cell of every column.
+
+A Shape is the ordered list of rotation templates of one pentomino, and is what
+a Pentomino holds a reference to. Shapes are shared and must never be mutated.
+"""
+
+FILLED = "O"
+
+class Template:
+
+	__slots__ = ("rows", "cells", "left", "right", "top", "bottom",
+				"width", "height", "rowMasks", "columnBottoms")
+
+	def __init__(self, rows):
+		# rows is the ASCII template, one string per row, "O" marking a mino
+		self.rows = tuple(rows)
+
+		# (dx, dy) of every mino relative to the pentomino's x and y
+		self.cells = tuple((x, y) for y in range(len(rows))
+							for x in range(len(rows[y])) if rows[y][x] == FILLED)
+
+		if not self.cells:
+			raise ValueError("template has no minos!")
+
+		# bounding box of the filled cells, inclusive
+		self.left = min(x for x, y in self.cells)
+		self.right = max(x for x, y in self.cells)
+		self.top = min(y for x, y in self.cells)
+		self.bottom = max(y for x, y in self.cells)
+		self.width = self.right - self.left + 1
+		self.height = self.bottom - self.top + 1
+
+		# (dy, mask) for every filled row, shifted so the leftmost filled column is bit 0
+		masks = {}
+		for x, y in self.cells:
+			masks[y] = masks.get(y, 0) | (1 << (x - self.left))
+		self.rowMasks = tuple(sorted(masks.items()))
+
+		# (dx, dy) of the lowest mino in every filled column
+		bottoms = {}
+		for x, y in self.cells:
+			bottoms[x] = max(bottoms.get(x, y), y)
+		self.columnBottoms = tuple(sorted(bottoms.items()))
+
+	def __len__(self):
+		return len(self.rows)
+
+	def __getitem__(self, y):
+		return self.rows[y]
+
+	def __deepcopy__(self, memo):
+		return self   # compiled templates are immutable and shared
+
+	def __repr__(self):
+		return "Template(%r)" % (self.rows,)
+
+
+class Shape:
+
+	__slots__ = ("name", "templates")
+
+	def __init__(self, name, templates):
+		# templates is the list of rotations, each a list of ASCII rows
+		self.name = name
+		self.templates = tuple(Template(rows) for rows in templates)
+
+	def __len__(self):
+		return len(self.templates)
+
+	def __getitem__(self, rotation):
+		return self.templates[rotation]
+
+	def __iter__(self):
+		return iter(self.templates)
+
+	def __deepcopy__(self, memo):
+		return self   # compiled shapes are immutable and shared
+
+	def __repr__(self):
+		return "Shape(%r)" % self.name
@@ -0,0 +1,342 @@
+""" Read-only spectator feed. A SpectatorHub publishes the state changes of any
+number of games as one compact binary stream, fanned out to every subscriber:
+
+	KEYFRAME  game, sequence, board width, board height, full board delta
+	DIFF      game, sequence, board delta (rows that changed, piece, next,
+	          hold, score... only what differs from the previous frame)
+	END       game, sequence
+
+Board deltas are encoded as in multiplayer.py, and frames are framed like its
+messages. Each game gets a keyframe every keyframe_interval frames; frames in
+which nothing changed are not sent at all. Because a delta sets rows and
+values rather than patching them, a diff can be applied on top of any
+keyframe at least as old as its base.
+
+Every subscriber has a bounded queue. When a slow consumer's queue would
+overflow, it is emptied and replaced with a fresh keyframe of every game (plus
+the END frames it held), so the consumer skips ahead instead of falling further
+behind.
+
+publish() must be called from the thread running the event loop of the
+SpectatorServer, for instance from the tick of a MatchServer.
+
+	python spectator.py demo --games 24 --port 7778    # computer-played games to watch
+	python spectator.py watch --port 7778               # report what a dashboard receives
+"""
+
+import argparse, asyncio, random, time
+from collections import deque
+
+from ai import AI
+from codec import encodeVarint, decodeVarint
+from controls import Controller
+from engine import Engine
+from multiplayer import BoardView, RemoteGame, message, readMessage
+
+KEYFRAME = 1
+DIFF = 2
+END = 3
+
+NOTHING_CHANGED = encodeVarint(0)    # a board delta without any flags
+
+
+def isEnd(frame):
+	# whether a frame made by message() is an END
+	length, offset = decodeVarint(frame, 0)
+	return frame[offset] == END
+
+
+class GameStream:
+	# the frames of one game
+
+	def __init__(self, game, engine, keyframe_interval):
+		self.game = game
+		self.engine = engine
+		self.keyframeInterval = keyframe_interval
+		self.view = BoardView(engine.board.BOARD_HEIGHT)   # the state as of the last frame
+		self.sequence = 0
+		self.sinceKeyframe = keyframe_interval     # so the first frame is a keyframe
+		self.cached = None                         # (sequence, keyframe) made for slow subscribers
+
+	def frame(self):
+		# the next frame of the game, or None if nothing changed
+		if self.sinceKeyframe >= self.keyframeInterval:
+			self.view = BoardView(self.engine.board.BOARD_HEIGHT)
+			self.sinceKeyframe = 0
+			self.sequence += 1
+			frame = self.encodeKeyframe(self.view)
+			self.cached = (self.sequence, frame)
+			return frame
+
+		delta = self.view.delta(self.engine)
+		if delta == NOTHING_CHANGED:
+			return None
+
+		self.sinceKeyframe += 1
+		self.sequence += 1
+		return message(DIFF, encodeVarint(self.game) + encodeVarint(self.sequence) + delta)
+
+	def keyframe(self):
+		# a keyframe of the game as of its latest frame, shared by every subscriber that needs it
+		if self.cached is None or self.cached[0] != self.sequence:
+			self.cached = (self.sequence, self.encodeKeyframe(BoardView(self.engine.board.BOARD_HEIGHT)))
+		return self.cached[1]
+
+	def encodeKeyframe(self, view):
+		board = self.engine.board
+		return message(KEYFRAME, encodeVarint(self.game) + encodeVarint(self.sequence)
+			+ encodeVarint(board.BOARD_WIDTH) + encodeVarint(board.BOARD_HEIGHT) + view.delta(self.engine))
+
+
+class Subscriber:
+
+	def __init__(self, limit):
+		self.frames = deque()
+		self.limit = limit        # most frames waiting before the queue is reset to keyframes
+		self.resets = 0
+		self.wake = asyncio.Event()
+
+	def push(self, frames, keyframes):
+		if len(self.frames) + len(frames) > self.limit:
+			# the ends of games are kept, since no keyframe will ever mention those games again
+			ends = [frame for frame in self.frames if isEnd(frame)] + [frame for frame in frames if isEnd(frame)]
+			self.frames.clear()
+			self.frames.extend(keyframes())
+			self.frames.extend(ends)
+			self.resets += 1
+		else:
+			self.frames.extend(frames)
+		self.wake.set()
+
+
+class SpectatorHub:
+
+	def __init__(self, keyframe_interval = 300, queue_limit = 256):
+		self.keyframeInterval = keyframe_interval
+		self.queueLimit = queue_limit
+		self.streams = {}         # game id -> GameStream
+		self.subscribers = set()
+		self.nextGame = 0
+
+		self.frames = 0
+		self.bytes = 0
+
+	def addGame(self, engine):
+		# starts streaming an engine's game, returns its game id
+		game = self.nextGame
+		self.nextGame += 1
+		self.streams[game] = GameStream(game, engine, self.keyframeInterval)
+		return game
+
+	def removeGame(self, game):
+		# publishes what is left of the game and its end, then stops streaming it
+		stream = self.streams.get(game)
+		if stream is None:
+			return
+		frame = stream.frame()
+		del self.streams[game]
+		frames = [frame] if frame is not None else []
+		frames.append(message(END, encodeVarint(game) + encodeVarint(stream.sequence + 1)))
+		self.fanOut(frames)
+
+	def publish(self):
+		# sends every subscriber the frames of the games that changed since the last call
+		self.fanOut([frame for frame in (stream.frame() for stream in self.streams.values())
+			if frame is not None])
+
+	def fanOut(self, frames):
+		if not frames:
+			return
+		self.frames += len(frames)
+		self.bytes += sum(len(frame) for frame in frames)
+		for subscriber in self.subscribers:
+			subscriber.push(frames, self.keyframes)
+
+	def keyframes(self):
+		return [stream.keyframe() for stream in self.streams.values()]
+
+	def subscribe(self, limit = None):
+		# a new subscriber, starting with a keyframe of every game
+		subscriber = Subscriber(limit or self.queueLimit)
+		subscriber.frames.extend(self.keyframes())
+		subscriber.wake.set()
+		self.subscribers.add(subscriber)
+		return subscriber
+
+	def unsubscribe(self, subscriber):
+		self.subscribers.discard(subscriber)
+
+
+class SpectatorServer:
+	# serves the hub's stream to every client that connects; clients never send anything
+
+	def __init__(self, hub, host = "127.0.0.1", port = 0):
+		self.hub = hub
+		self.host = host
+		self.port = port
+		self.server = None
+		self.connections = set()
+
+	async def start(self):
+		self.server = await asyncio.start_server(self.handle, self.host, self.port)
+		self.port = self.server.sockets[0].getsockname()[1]
+		return self
+
+	async def close(self):
+		self.server.close()
+		for task in self.connections:
+			task.cancel()
+		await asyncio.gather(*self.connections, return_exceptions = True)
+		await self.server.wait_closed()
+
+	async def handle(self, reader, writer):
+		task = asyncio.current_task()
+		self.connections.add(task)
+		subscriber = self.hub.subscribe()
+		try:
+			while True:
+				await subscriber.wake.wait()
+				subscriber.wake.clear()
+				frames = b"".join(subscriber.frames)
+				subscriber.frames.clear()
+				writer.write(frames)
+				await writer.drain()    # a slow client waits here while its queue fills up
+		except (ConnectionError, asyncio.CancelledError):
+			pass
+		finally:
+			self.hub.unsubscribe(subscriber)
+			self.connections.discard(task)
+			writer.close()
+
+
+class SpectatorClient:
+	# a dashboard's copy of every game in the stream
+
+	def __init__(self):
+		self.games = {}           # game id -> RemoteGame
+		self.sequences = {}       # game id -> sequence of the last frame applied
+		self.reader = None
+		self.writer = None
+		self.keyframes = 0
+		self.diffs = 0
+		self.bytes = 0
+
+	async def connect(self, host, port):
+		self.reader, self.writer = await asyncio.open_connection(host, port)
+
+	def apply(self, kind, body):
+		game, offset = decodeVarint(body, 0)
+		sequence, offset = decodeVarint(body, offset)
+
+		if kind == KEYFRAME:
+			width, offset = decodeVarint(body, offset)
+			height, offset = decodeVarint(body, offset)
+			self.games[game] = RemoteGame(width, height)
+			self.games[game].apply(body, offset)
+			self.keyframes += 1
+		elif kind == DIFF:
+			if game not in self.games:    # joined or skipped ahead mid-game, wait for its keyframe
+				return
+			self.games[game].apply(body, offset)
+			self.diffs += 1
+		elif kind == END:
+			self.games.pop(game, None)
+			self.sequences.pop(game, None)
+			return
+
+		self.sequences[game] = sequence
+
+	async def receive(self):
+		# applies the next frame and returns its type, None once the stream ends
+		kind, body = await readMessage(self.reader)
+		if kind is not None:
+			self.bytes += len(body)
+			self.apply(kind, body)
+		return kind
+
+	def close(self):
+		if self.writer is not None:
+			self.writer.close()
+
+
+async def runDemo(hub, games, seconds = None, tick_rate = Engine.TICKS_PER_SECOND, pace = 20, seed = 0):
+	# Plays `games` computer games at once, one placement every `pace` ticks, publishing
+	# every tick. Finished games are replaced by new ones. Runs forever if seconds is None.
+	rng = random.Random(seed)
+	ai = AI(budget_ms = 2)
+
+	def newGame():
+		engine = Engine(seed = rng.randrange(1 << 31))
+		return [engine, Controller(engine), hub.addGame(engine), rng.randrange(pace)]
+
+	running = [newGame() for i in range(games)]
+	loop = asyncio.get_running_loop()
+	end = None if seconds is None else loop.time() + seconds
+	due = loop.time()
+
+	while end is None or loop.time() < end:
+		for i, (engine, controller, game, wait) in enumerate(running):
+			if wait == 0:
+				placement = ai(engine)
+				if placement is None:
+					engine.gameOver = True
+				else:
+					engine.hardDropTo(placement, trusted = True)
+			controller.tick()
+			running[i][3] = (wait - 1) % pace
+
+			if engine.gameOver:
+				hub.removeGame(game)
+				running[i] = newGame()
+
+		hub.publish()
+		due += 1.0 / tick_rate
+		await asyncio.sleep(max(0.0, due - loop.time()))
+
+async def watch(host, port, seconds):
+	client = SpectatorClient()
+	await client.connect(host, port)
+	start = time.perf_counter()
+	try:
+		while time.perf_counter() - start < seconds:
+			if await asyncio.wait_for(client.receive(), seconds) is None:
+				break
+	except asyncio.TimeoutError:
+		pass
+	client.close()
+
+	elapsed = time.perf_counter() - start
+	print("%d games, %d keyframes, %d diffs, %.1f KB/s (%.1f bytes per frame)" % (len(client.games),
+		client.keyframes, client.diffs, client.bytes / 1024.0 / elapsed,
+		client.bytes / max(1, client.keyframes + client.diffs)))
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = "Spectator stream of live pentris games.")
+	commands = parser.add_subparsers(dest = "command", required = True)
+
+	demo = commands.add_parser("demo", help = "serve computer-played games")
+	demo.add_argument("--host", default = "0.0.0.0")
+	demo.add_argument("--port", type = int, default = 7778)
+	demo.add_argument("--games", type = int, default = 24)
+	demo.add_argument("--keyframe-interval", type = int, default = 300)
+
+	viewer = commands.add_parser("watch", help = "subscribe and report what arrives")
+	viewer.add_argument("--host", default = "127.0.0.1")
+	viewer.add_argument("--port", type = int, default = 7778)
+	viewer.add_argument("--seconds", type = float, default = 10)
+
+	args = parser.parse_args(argv)
+
+	if args.command == "demo":
+		async def serve():
+			hub = SpectatorHub(args.keyframe_interval)
+			server = await SpectatorServer(hub, args.host, args.port).start()
+			print("streaming %d games on port %d" % (args.games, server.port))
+			await runDemo(hub, args.games)
+		asyncio.run(serve())
+	else:
+		asyncio.run(watch(args.host, args.port, args.seconds))
+
+
+if __name__ == '__main__':
+	main()
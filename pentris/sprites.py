@@ -0,0 +1,54 @@
+""" Pre-rendered mino sprites. Rather than issuing one pygame.draw.rect per cell,
+the board is drawn by blitting one small surface per mino, all in a single
+Surface.blits() call. The sprites of a given mino size are built once, the
+first time that size is drawn: an opaque square per color and a transparent
+outline for the ghost piece.
+"""
+
+import pygame
+
+from board import Board
+
+
+class MinoSprites:
+
+	GHOST_KEY = (255, 0, 254)    # transparent color inside the ghost outline
+
+	def __init__(self, mino_size):
+		self.MINO_SIZE = mino_size
+		self.minos = {}
+		self.ghosts = {}
+
+		for color in Board.COLORS:
+			self.mino(color)
+		self.ghost(Board.GRAY)
+
+	def mino(self, color):
+		# the filled square drawn for a mino of the given color, built on first use
+		sprite = self.minos.get(color)
+		if sprite is None:
+			sprite = pygame.Surface((self.MINO_SIZE-1, self.MINO_SIZE-1))
+			sprite.fill(color)
+			self.minos[color] = sprite
+		return sprite
+
+	def ghost(self, color):
+		# the outline drawn for the ghost piece, transparent inside
+		sprite = self.ghosts.get(color)
+		if sprite is None:
+			sprite = pygame.Surface((self.MINO_SIZE-1, self.MINO_SIZE-1))
+			sprite.fill(self.GHOST_KEY)
+			pygame.draw.rect(sprite, color, sprite.get_rect(), 1)
+			sprite.set_colorkey(self.GHOST_KEY)
+			self.ghosts[color] = sprite
+		return sprite
+
+
+_SPRITES = {}
+
+def spritesFor(mino_size):
+	# the sprites for a mino size, so a board whose MINO_SIZE changes gets new ones
+	sprites = _SPRITES.get(mino_size)
+	if sprites is None:
+		sprites = _SPRITES[mino_size] = MinoSprites(mino_size)
+	return sprites
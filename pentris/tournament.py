@@ -0,0 +1,145 @@
+""" Runs many seeded headless games in parallel and reports how a policy fares.
+
+	python tournament.py --games 200 --policy ai --workers 8
+
+Every game is played by a fresh Engine in a worker process, driven by a policy:
+a callable taking the engine and returning the Placement to play for its
+current piece (or None to hard drop it where it is). Policies are named on the
+command line, either one of POLICIES or "module:name" for any importable
+callable that builds one. Results are printed as each game finishes, followed
+by aggregate statistics with 95% confidence intervals.
+"""
+
+import argparse, importlib, math, random, statistics, sys, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import actions
+from ai import AI
+from engine import Engine
+from factory import RANDOMIZERS
+from pentomino import Placement
+
+
+class RandomPolicy:
+	# drops each piece straight down at a random column and rotation
+
+	def __init__(self, seed = None):
+		self.random = random.Random(seed)
+
+	def __call__(self, engine):
+		piece = engine.currentPiece
+		rotation = self.random.randrange(len(piece.shape))
+		template = piece.shape[rotation]
+		x = self.random.randint(-template.left, engine.board.BOARD_WIDTH - 1 - template.right)
+		return Placement(x, rotation)
+
+
+POLICIES = {
+	"ai": lambda seed, budget_ms: AI(budget_ms = budget_ms),
+	"random": lambda seed, budget_ms: RandomPolicy(seed),
+}
+
+def makePolicy(name, seed, budget_ms):
+	if name in POLICIES:
+		return POLICIES[name](seed, budget_ms)
+
+	if ":" not in name:
+		raise ValueError("unknown policy %r, expected one of %s or module:name"
+			% (name, ", ".join(sorted(POLICIES))))
+
+	module, attribute = name.split(":", 1)
+	return getattr(importlib.import_module(module), attribute)()
+
+def playGame(seed, policy_name, max_pieces, budget_ms, randomizer = "bag", preview = 1):
+	# Plays one game to the end (or to max_pieces) and returns its statistics.
+	# Runs in a worker process.
+	engine = Engine(seed = seed, randomizer = randomizer, preview = preview)
+	policy = makePolicy(policy_name, seed, budget_ms)
+	start = time.perf_counter()
+
+	while not engine.gameOver and engine.piecesPlaced < max_pieces:
+		placement = policy(engine)
+		try:
+			if placement is None:
+				engine.step(actions.HARD_DROP)
+			else:
+				engine.hardDropTo(placement)
+		except ValueError:    # an illegal placement forfeits the game
+			engine.gameOver = True
+
+	elapsed = time.perf_counter() - start
+	return {
+		"seed": seed,
+		"score": engine.score,
+		"lines": engine.lines,
+		"level": engine.level,
+		"pieces": engine.piecesPlaced,
+		"pieces_per_second": engine.piecesPlaced / elapsed if elapsed > 0 else 0.0,
+		"topped_out": engine.gameOver,
+	}
+
+
+STATISTICS = ("score", "lines", "level", "pieces", "pieces_per_second")
+
+def summarize(results):
+	# mean, standard deviation and 95% confidence interval of every statistic, none without results
+	summary = {}
+	if not results:
+		return summary
+	for key in STATISTICS:
+		values = [result[key] for result in results]
+		mean = statistics.fmean(values)
+		stdev = statistics.stdev(values) if len(values) > 1 else 0.0
+		margin = 1.96 * stdev / math.sqrt(len(values))
+		summary[key] = (mean, stdev, mean - margin, mean + margin, min(values), max(values))
+	return summary
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = "Run seeded headless pentris games in parallel.")
+	parser.add_argument("--games", type = int, default = 100, help = "number of games to play")
+	parser.add_argument("--seed", type = int, default = 0, help = "seed of the first game")
+	parser.add_argument("--policy", default = "ai", help = "one of %s, or module:name" % ", ".join(sorted(POLICIES)))
+	parser.add_argument("--workers", type = int, default = None, help = "worker processes (default: all cores)")
+	parser.add_argument("--randomizer", default = "bag", choices = sorted(RANDOMIZERS), help = "piece randomizer")
+	parser.add_argument("--preview", type = int, default = 1, help = "upcoming pieces visible to the policy")
+	parser.add_argument("--max-pieces", type = int, default = 10000, help = "stop a game after this many pieces")
+	parser.add_argument("--budget-ms", type = float, default = 12, help = "per-piece thinking time of the ai policy")
+	parser.add_argument("--quiet", action = "store_true", help = "only print the summary")
+	args = parser.parse_args(argv)
+
+	if args.games < 1:
+		parser.error("--games must be at least 1")
+
+	try:
+		makePolicy(args.policy, args.seed, args.budget_ms)    # fail early on a bad policy name
+	except (ValueError, ImportError, AttributeError) as error:
+		parser.error(str(error))
+
+	results = []
+	start = time.perf_counter()
+
+	with ProcessPoolExecutor(max_workers = args.workers) as pool:
+		futures = [pool.submit(playGame, seed, args.policy, args.max_pieces, args.budget_ms,
+				args.randomizer, args.preview)
+			for seed in range(args.seed, args.seed + args.games)]
+
+		for future in as_completed(futures):
+			result = future.result()
+			results.append(result)
+			if not args.quiet:
+				print("[%d/%d] seed %d: score %d, lines %d, level %d, %d pieces, %.1f pieces/s"
+					% (len(results), args.games, result["seed"], result["score"], result["lines"],
+						result["level"], result["pieces"], result["pieces_per_second"]))
+				sys.stdout.flush()
+
+	elapsed = time.perf_counter() - start
+	print("\n%d games with policy %r and %s randomizer in %.1fs"
+		% (len(results), args.policy, args.randomizer, elapsed))
+	print("%-18s %12s %12s %25s %10s %10s" % ("", "mean", "stdev", "95% CI", "min", "max"))
+	for key, (mean, stdev, low, high, smallest, largest) in summarize(results).items():
+		print("%-18s %12.1f %12.1f %12.1f - %-10.1f %10.1f %10.1f"
+			% (key, mean, stdev, low, high, smallest, largest))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,106 @@
+""" Zobrist keys for hashing game positions. Every (column, row) cell of a board,
+and every placement of a piece, has a fixed pseudo-random 64-bit key; the hash
+of a position is the XOR of the keys of what it holds. Adding or removing a
+mino updates the hash with a single XOR, so boards keep theirs up to date as
+they change (see Board.hash) instead of rehashing all of their cells.
+
+Keys come from splitmix64 over the cell or piece coordinates, so they are the
+same in every process and need no tables to be shipped around.
+"""
+
+MASK = (1 << 64) - 1
+
+CELL = 1       # salts keeping the key spaces of cells, pieces and the hold slot apart
+PIECE = 2
+HOLD = 3
+
+_cellKeys = {}       # (width, height) -> BoardKeys
+_shapeIds = {}       # Shape -> shapeId
+
+
+def mix(value):
+	# splitmix64 finalizer
+	value = (value + 0x9e3779b97f4a7c15) & MASK
+	value = ((value ^ (value >> 30)) * 0xbf58476d1ce4e5b9) & MASK
+	value = ((value ^ (value >> 27)) * 0x94d049bb133111eb) & MASK
+	return value ^ (value >> 31)
+
+def key(salt, *coordinates):
+	value = salt
+	for coordinate in coordinates:
+		value = mix(value ^ (coordinate & MASK))
+	return value
+
+class LazyRows(dict):
+	# row -> function(row), computed the first time the row is looked up
+
+	def __init__(self, function):
+		self.function = function
+
+	def __missing__(self, y):
+		value = self[y] = self.function(y)
+		return value
+
+
+class BoardKeys:
+	# The keys of every cell of a board size, keys[y][x], and for each row the
+	# XOR of the keys of every combination of 8 columns, so whole rows can be
+	# hashed 8 columns at a time (see rowHash). Rows are only filled in once
+	# used, so very tall boards don't pay for the rows nothing ever reaches.
+
+	__slots__ = ("cells", "tables")
+
+	def __init__(self, width, height):
+		self.cells = LazyRows(lambda y: [key(CELL, x, y) for x in range(width)])
+		self.tables = LazyRows(lambda y: [byteTable(self.cells[y][i:i + 8]) for i in range(0, width, 8)])
+
+	def __getitem__(self, y):
+		return self.cells[y]
+
+def byteTable(keys):
+	# table[byte] is the XOR of keys[i] for every bit i set in byte
+	table = [0] * 256
+	for byte in range(1, 256):
+		low = byte & -byte
+		index = low.bit_length() - 1
+		table[byte] = table[byte ^ low] ^ (keys[index] if index < len(keys) else 0)
+	return table
+
+def cellKeys(width, height):
+	# the BoardKeys of a board size, shared by every board of that size
+	keys = _cellKeys.get((width, height))
+	if keys is None:
+		keys = _cellKeys[(width, height)] = BoardKeys(width, height)
+	return keys
+
+def rowHash(keys, y, mask):
+	# XOR of the keys of the cells of row y whose columns are set in mask
+	value = 0
+	for table in keys.tables[y]:
+		value ^= table[mask & 255]
+		mask >>= 8
+	return value
+
+def boardHash(rows, keys, start = 0):
+	# the hash of a board, or of its rows from row start down
+	value = 0
+	for y, mask in enumerate(rows, start):
+		if mask:
+			value ^= rowHash(keys, y, mask)
+	return value
+
+def shapeId(shape):
+	# a number standing for the shape, from its name so it is the same in every process
+	number = _shapeIds.get(shape)
+	if number is None:
+		number = 0
+		for byte in shape.name.encode():
+			number = mix(number ^ byte)
+		_shapeIds[shape] = number
+	return number
+
+def pieceKey(shape, rotation, x, y):
+	return key(PIECE, shapeId(shape), rotation, x, y)
+
+def holdKey(shape):
+	return key(HOLD, shapeId(shape)) if shape is not None else 0